@@ -4,107 +4,1953 @@ Serv00 & ClawCloud 统一保活脚本
 支持多账号批量登录，自动发送 Telegram 通知
 """
 
+import time
+PROCESS_STARTED = time.monotonic()  # 用于 --profile-startup 统计启动耗时
+
+import argparse
 import json
 import asyncio
+import base64
+import hashlib
+import importlib
+import math
 import os
+import re
 import sys
-import time
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from urllib.parse import urlparse
+from typing import List, Dict, Optional, Tuple
 import random
 
-# 异步库
-import aiofiles
-from pyppeteer import launch
-
-# 同步库
-import requests
-
 # ==================== 配置 ====================
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_PROGRESS = os.getenv('TELEGRAM_PROGRESS', '1') != '0'  # 运行期间原地更新一条进度消息
+TELEGRAM_PROGRESS_INTERVAL = float(os.getenv('TELEGRAM_PROGRESS_INTERVAL', '15'))  # 进度消息最短更新间隔（秒）
+TELEGRAM_ACCOUNT_MESSAGES = os.getenv('TELEGRAM_ACCOUNT_MESSAGES', '0') == '1'  # 是否为每个账号单独发送通知
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Serv00 配置
+SERV00_PANEL_URL = os.getenv('SERV00_PANEL_URL', 'https://panel{panelnum}.serv00.com')
+SERV00_CONCURRENCY = int(os.getenv('SERV00_CONCURRENCY', '4'))  # 全局同时登录数
+SERV00_PANEL_CONCURRENCY = int(os.getenv('SERV00_PANEL_CONCURRENCY', '1'))  # 单个面板同时登录数
+SERV00_PANEL_DELAY = (1000, 8000)  # 同一面板两次登录之间的随机间隔（毫秒）
+SERV00_HTTP_LOGIN = os.getenv('SERV00_HTTP_LOGIN', '1') != '0'  # 优先使用纯 HTTP 登录（需要 aiohttp）
+SERV00_CSRF_RE = re.compile(r'name=["\']csrfmiddlewaretoken["\']\s+value=["\']([^"\']+)')
+SERV00_LOGOUT_RE = re.compile(r'href=["\']/logout/["\']')
+SERV00_OVERLOAD_RE = re.compile(r'Too Many Requests|Service (?:Temporarily )?Unavailable|Bad Gateway|Gateway Time-?out',
+                                re.IGNORECASE)  # 面板过载时的错误页
+SERV00_FORM_ERROR_RE = re.compile(r'errorlist|alert--error|błąd|invalid|incorrect|nieprawidłow', re.IGNORECASE)
 
 # ClawCloud 配置
-CLAW_CLOUD_URL = "https://us-west-1.run.claw.cloud"
+CLAW_CLOUD_URL = os.getenv('CLAW_CLOUD_URL', "https://us-west-1.run.claw.cloud")
+CLAW_CLOUD_DOMAIN = os.getenv('CLAW_CLOUD_DOMAIN', 'claw.cloud')  # 登录成功后重定向到的域名
+GITHUB_DOMAIN = os.getenv('GITHUB_DOMAIN', 'github.com')
 SIGNIN_URL = f"{CLAW_CLOUD_URL}/signin"
 DEVICE_VERIFY_WAIT = 80
 TWO_FACTOR_WAIT = 60
-
+TOTP_MIN_VALIDITY = float(os.getenv('TOTP_MIN_VALIDITY', '5'))  # 验证码剩余有效期不足该秒数时等待下一个窗口
+TOTP_CLOCK_SKEW = os.getenv('TOTP_CLOCK_SKEW')  # 服务器时间减本地时间（秒），不设置时根据响应头 Date 估算
+VERIFY_RELOAD_INTERVAL = 10  # 等待人工验证期间刷新页面的间隔（秒）
+VERIFY_INPUT_SELECTORS = (
+    'input[name="app_otp"]',
+    'input[name="otp"]',
+    'input[id="app_totp"]',
+    'input.js-verification-code-input-auto-submit'
+)
+GITHUB_BUTTON_SELECTOR = 'button:has-text("GitHub"), a:has-text("GitHub")'
+GITHUB_AFTER_LOGIN_URLS = ('two-factor', 'two_factor', 'verified-device', 'login/oauth', CLAW_CLOUD_DOMAIN)
+CLAWCLOUD_CONCURRENCY = int(os.getenv('CLAWCLOUD_CONCURRENCY', '2'))  # 同时登录的账号数
+CLAWCLOUD_DELAY = (3000, 8000)  # 相邻两个账号开始登录之间的随机间隔（毫秒）
+
+# 截图配置（截图只保存在内存中，不写入磁盘）
+SCREENSHOT_MODE = os.getenv('SCREENSHOT_MODE', 'failure')  # none / failure / last / all
+SCREENSHOT_FORMAT = os.getenv('SCREENSHOT_FORMAT', 'jpeg')  # jpeg / webp / png
+SCREENSHOT_QUALITY = int(os.getenv('SCREENSHOT_QUALITY', '70'))
+SCREENSHOT_MAX_BYTES = int(os.getenv('SCREENSHOT_MAX_BYTES', str(1024 * 1024)))
+
+# 会话缓存配置
+SESSION_CACHE_ENABLED = os.getenv('SESSION_CACHE', '1') != '0'
+SESSION_CACHE_DIR = os.getenv('SESSION_CACHE_DIR', '.session_cache')
+SESSION_CACHE_TTL_DAYS = float(os.getenv('SESSION_CACHE_TTL_DAYS', '14'))
+SESSION_CACHE_KEY = os.getenv('SESSION_CACHE_KEY')  # 设置后加密存储（需要 cryptography）
+SESSION_PLAINTEXT_EXCLUDE = ('github.com',)  # 未加密时不落盘这些域名的 cookie 与 localStorage
+
+# 账号状态配置（增量运行：最近已成功的账号跳过）
+STATE_ENABLED = os.getenv('ACCOUNT_STATE', '1') != '0'
+STATE_FILE = os.getenv('ACCOUNT_STATE_FILE', '.keepalive_state/accounts.jsonl')
+STATE_FRESH_HOURS = float(os.getenv('ACCOUNT_STATE_FRESH_HOURS', '24'))  # 该时间内登录成功过的账号跳过（0 不跳过）
+RESULTS_FILE = os.getenv('RESULTS_FILE', 'results.jsonl')  # 登录结果流（JSON Lines，留空只保存在内存中）
+SERV00_INACTIVITY_DAYS = float(os.getenv('SERV00_INACTIVITY_DAYS', '90'))  # 超过该天数未登录的账号会被删除
+CLAWCLOUD_INACTIVITY_DAYS = float(os.getenv('CLAWCLOUD_INACTIVITY_DAYS', '30'))
+
+
+# 重试与运行截止时间
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', '3'))  # 每个账号最多尝试次数（只重试临时性失败）
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '5'))  # 首次重试前的退避时间（秒），之后每次翻倍
+RETRY_MAX_DELAY = 120  # 单次退避上限（秒）
+RUN_DEADLINE_MINUTES = float(os.getenv('RUN_DEADLINE_MINUTES', '50'))  # 从启动算起的运行截止时间
+FAILURE_TRANSIENT = 'transient'  # 超时、网络错误等临时性失败，可以重试
+FAILURE_CREDENTIAL = 'credential'  # 用户名或密码被拒绝，重试无用
+FAILURE_VERIFICATION = 'verification'  # 需要人工完成的验证未完成，重试无用
+FAILURE_CONFIG = 'config'  # 账号配置不完整
+FAILURE_DEADLINE = 'deadline'  # 到达运行截止时间，未完成
+FAILURE_LABELS = {
+    FAILURE_CREDENTIAL: '用户名或密码错误',
+    FAILURE_VERIFICATION: '验证未完成',
+    FAILURE_TRANSIENT: '超时或网络错误',
+    FAILURE_DEADLINE: '运行超时未处理',
+    FAILURE_CONFIG: '配置不完整',
+}
+
+# 浏览器资源预算（Serv00 与 ClawCloud 同时运行时共用）
+BROWSER_MAX_CONTEXTS = int(os.getenv('BROWSER_MAX_CONTEXTS', '4'))  # 同时打开的浏览器上下文数
+BROWSER_MEMORY_MB = int(os.getenv('BROWSER_MEMORY_MB', '2048'))  # 浏览器可用内存（MB）
+BROWSER_CONTEXT_MEMORY_MB = 150  # 单个登录上下文的内存估算（MB）
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '2'))  # 预热并复用的空闲页面数
+BROWSER_RECYCLE_ACCOUNTS = int(os.getenv('BROWSER_RECYCLE_ACCOUNTS', '50'))  # 浏览器进程服务多少个账号后重启（0 不限）
+BROWSER_RECYCLE_RSS_MB = int(os.getenv('BROWSER_RECYCLE_RSS_MB', '1536'))  # 浏览器进程内存超过该值后重启（0 不检查）
+
+# 自适应并发（按目标主机 AIMD 调整同时登录数）
+ADAPTIVE_CONCURRENCY = os.getenv('ADAPTIVE_CONCURRENCY', '1') != '0'
+ADAPTIVE_MAX_PER_HOST = int(os.getenv('ADAPTIVE_MAX_PER_HOST', '4'))  # 单主机并发上限的最大值
+ADAPTIVE_LATENCY_FACTOR = float(os.getenv('ADAPTIVE_LATENCY_FACTOR', '3'))  # 耗时超过基线的倍数视为过载
+
+# 资源拦截配置（登录不需要图片、字体、媒体与统计脚本）
+BLOCK_RESOURCES = os.getenv('BLOCK_RESOURCES', '1') != '0'
+BLOCKED_RESOURCE_TYPES = {'image', 'font', 'media'}
+BLOCKED_HOSTS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'hotjar.com', 'clarity.ms',
+    'segment.io', 'segment.com', 'mixpanel.com', 'facebook.net', 'collector.github.com',
+)
+RESOURCE_ALLOWLIST = {
+    'serv00': (),
+    # 验证码服务必须放行，否则 GitHub 可能无法完成登录
+    'clawcloud': ('octocaptcha.com', 'arkoselabs.com', 'hcaptcha.com', 'recaptcha.net', 'challenges.cloudflare.com'),
+}
+RESOURCE_SIZE_ESTIMATE = {'image': 30 * 1024, 'font': 40 * 1024, 'media': 300 * 1024, 'other': 20 * 1024}
+
+# 运行指标导出（留空则不导出）
+METRICS_JSON_PATH = os.getenv('METRICS_JSON', 'metrics.json')
+METRICS_PROM_PATH = os.getenv('METRICS_PROM', 'metrics.prom')
 
 # ==================== 工具类 ====================
 class Telegram:
-    """Telegram 通知工具"""
+    """
+    Telegram 通知工具
+
+    send / send_photo 只把消息放入队列并立即返回，由后台任务通过同一个连接池依次发送，
+    登录流程不会因为发送通知而阻塞。程序结束前需要调用 close() 把队列中的消息发完。
+
+    prompt / listen 用于接收用户回复（例如验证码）：有等待者时后台长轮询 getUpdates，
+    收到回复立即交给对应的等待者，没有等待者时停止轮询。
+
+    progress 维护一条进度消息：第一次调用时发送，之后最多每 TELEGRAM_PROGRESS_INTERVAL 秒
+    用 editMessageText 原地更新一次，只发送最新的内容。
+    """
+
+    api_base = 'https://api.telegram.org'
+    max_attempts = 5
+    poll_timeout = 25  # getUpdates 长轮询时间（秒）
+    message_limit = 4096  # 单条消息的最大长度
 
     def __init__(self):
         self.token = TELEGRAM_BOT_TOKEN
         self.chat_id = TELEGRAM_CHAT_ID
         self.enabled = bool(self.token and self.chat_id)
+        self.queue = None
+        self.worker = None
+        self.session = None
+        self.waiters = {}  # 提示消息 ID -> 等待回复的 Future
+        self.poller = None
+        self.update_offset = None
+        self.progress_text = None  # 最新的进度内容
+        self.progress_shown = None  # 已显示的进度内容
+        self.progress_id = None
+        self.progress_task = None
 
         if not self.enabled:
             print('未配置 Telegram Bot Token 或 Chat ID，跳过通知')
 
     def send(self, message: str):
-        """发送文本消息"""
+        """发送文本消息（非阻塞，超过长度限制时按行拆成多条）"""
+        if not self.enabled:
+            return
+
+        for chunk in self.split(message, self.message_limit):
+            payload = {
+                'chat_id': self.chat_id,
+                'text': chunk,
+                'parse_mode': 'HTML'
+            }
+            self.enqueue('sendMessage', payload)
+
+    @staticmethod
+    def split(message: str, limit: int) -> List[str]:
+        """按行把消息拆成不超过 limit 个字符的若干段（HTML 标签不跨行，拆分后仍然完整）"""
+        chunks = []
+        chunk = ''
+        for line in message.splitlines(keepends=True):
+            while len(line) > limit:
+                if chunk:
+                    chunks.append(chunk)
+                    chunk = ''
+                chunks.append(line[:limit])
+                line = line[limit:]
+            if len(chunk) + len(line) > limit:
+                chunks.append(chunk)
+                chunk = ''
+            chunk += line
+        if chunk.strip():
+            chunks.append(chunk)
+        return chunks
+
+    def progress(self, text: str):
+        """更新进度消息（非阻塞，按间隔合并更新）"""
+        if not self.enabled:
+            return
+        self.progress_text = text
+        if self.progress_task is None:
+            self.progress_task = asyncio.get_running_loop().create_task(self.run_progress())
+
+    async def run_progress(self):
+        """后台更新进度消息：内容有变化时才调用 API"""
+        while True:
+            await self.show_progress()
+            await asyncio.sleep(TELEGRAM_PROGRESS_INTERVAL)
+
+    async def show_progress(self):
+        """发送或编辑进度消息"""
+        text = self.progress_text
+        if text is None or text == self.progress_shown:
+            return
+        self.progress_shown = text
+        data = {'chat_id': self.chat_id, 'text': text[:self.message_limit], 'parse_mode': 'HTML'}
+        try:
+            if self.progress_id is None:
+                body = await self.deliver('sendMessage', data)
+                self.progress_id = body and body.get('result', {}).get('message_id')
+            else:
+                await self.deliver('editMessageText', {**data, 'message_id': self.progress_id})
+        except Exception as e:
+            print(f'更新 Telegram 进度消息时出错: {e}')
+
+    def send_photo(self, photo, caption: str = "", filename: str = 'photo.png'):
+        """
+        发送图片（非阻塞）
+
+        Args:
+            photo: 图片文件路径或图片字节
+            caption: 图片说明
+            filename: 上传时使用的文件名（决定图片格式）
+        """
         if not self.enabled:
             return
 
-        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
-        payload = {
+        if isinstance(photo, str):
+            # 立即读入内存，避免发送前文件被其他账号覆盖
+            if not os.path.exists(photo):
+                return
+            filename = os.path.basename(photo)
+            with open(photo, 'rb') as f:
+                photo = f.read()
+
+        data = {'chat_id': self.chat_id, 'caption': caption[:1024]}
+        self.enqueue('sendPhoto', data, (filename, photo))
+
+    def enqueue(self, method: str, data: Dict, photo: Optional[Tuple[str, bytes]] = None):
+        """放入发送队列，首次调用时启动后台发送任务"""
+        if self.worker is None:
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.get_running_loop().create_task(self.run_worker())
+        self.queue.put_nowait((method, data, photo))
+
+    async def run_worker(self):
+        """后台发送任务：按入队顺序逐条发送"""
+        while True:
+            method, data, photo = await self.queue.get()
+            try:
+                await self.deliver(method, data, photo)
+            except Exception as e:
+                print(f"❌ 发送 Telegram 消息时出错: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def get_session(self):
+        """获取复用的 HTTP 会话（未安装 aiohttp 时返回 None，改用线程中的 requests）"""
+        if self.session is None:
+            try:
+                import aiohttp
+                self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+            except ImportError:
+                self.session = False
+        return self.session or None
+
+    async def post(self, method: str, data: Dict, photo: Optional[Tuple[str, bytes]] = None) -> Tuple[int, Dict]:
+        """调用一次 Bot API，返回 (状态码, 响应 JSON)"""
+        url = f"{self.api_base}/bot{self.token}/{method}"
+        session = await self.get_session()
+
+        if session is None:
+            import requests
+
+            def blocking_post():
+                if photo is None:
+                    return requests.post(url, json=data, timeout=30)
+                return requests.post(url, data=data, files={'photo': photo}, timeout=60)
+
+            response = await asyncio.to_thread(blocking_post)
+            try:
+                return response.status_code, response.json()
+            except ValueError:
+                return response.status_code, {'description': response.text}
+
+        if photo is None:
+            request = session.post(url, json=data)
+        else:
+            import aiohttp
+
+            form = aiohttp.FormData()
+            for key, value in data.items():
+                form.add_field(key, str(value))
+            filename, content = photo
+            form.add_field('photo', content, filename=filename)
+            request = session.post(url, data=form)
+        async with request as response:
+            try:
+                body = await response.json(content_type=None)
+            except ValueError:
+                body = {'description': await response.text()}
+            return response.status, body
+
+    async def deliver(self, method: str, data: Dict, photo: Optional[Tuple[str, bytes]] = None):
+        """发送一条消息：429 时按 retry_after 等待，5xx 与网络错误指数退避重试"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                status, body = await self.post(method, data, photo)
+            except Exception as e:
+                status, body = None, {'description': str(e)}
+
+            if status == 200:
+                if method == 'sendMessage':
+                    print('✅ Telegram 消息发送成功')
+                return body
+
+            if status == 429:
+                retry_after = body.get('parameters', {}).get('retry_after', 1)
+                print(f'Telegram 限流，{retry_after} 秒后重试')
+                await asyncio.sleep(retry_after)
+                continue
+
+            if (status is None or status >= 500) and attempt < self.max_attempts:
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            print(f"❌ 发送 Telegram 消息失败: {status} - {body.get('description', '')}")
+            return None
+
+        print(f"❌ 发送 Telegram 消息失败: 已重试 {self.max_attempts} 次")
+        return None
+
+    async def skip_old_updates(self):
+        """记下当前最新的 update，之后只处理新的回复"""
+        if self.update_offset is None:
+            self.update_offset = 0
+            try:
+                status, body = await self.post('getUpdates', {'offset': -1, 'timeout': 0})
+                results = body.get('result') or [] if status == 200 else []
+                if results:
+                    self.update_offset = results[-1]['update_id'] + 1
+            except Exception as e:
+                print(f'获取 Telegram 更新时出错: {e}')
+
+    async def prompt(self, message: str) -> Optional[int]:
+        """
+        立即发送一条需要用户回复的消息（不经过队列）
+
+        Returns:
+            Optional[int]: 消息 ID，未启用或发送失败时返回 None
+        """
+        if not self.enabled:
+            return None
+
+        await self.skip_old_updates()
+        body = await self.deliver('sendMessage', {
             'chat_id': self.chat_id,
             'text': message,
             'parse_mode': 'HTML'
+        })
+        if not body:
+            return None
+        return body.get('result', {}).get('message_id')
+
+    def listen(self, message_id: int) -> 'asyncio.Future':
+        """
+        等待对某条提示消息的回复
+
+        Returns:
+            asyncio.Future: 收到回复时以回复文本完成；不再需要时调用 cancel()
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[message_id] = future
+        future.add_done_callback(lambda f: self.waiters.get(message_id) is f and self.waiters.pop(message_id))
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.get_running_loop().create_task(self.poll_updates())
+        return future
+
+    async def poll_updates(self):
+        """长轮询 getUpdates，直到没有等待回复的消息"""
+        while self.waiters:
+            try:
+                status, body = await self.post('getUpdates', {
+                    'offset': self.update_offset,
+                    'timeout': self.poll_timeout,
+                    'allowed_updates': ['message']
+                })
+            except Exception as e:
+                status, body = None, {'description': str(e)}
+
+            if status != 200:
+                retry_after = body.get('parameters', {}).get('retry_after', 5) if status == 429 else 5
+                await asyncio.sleep(retry_after)
+                continue
+
+            for update in body.get('result', []):
+                self.update_offset = update['update_id'] + 1
+                self.dispatch(update.get('message') or {})
+
+    def dispatch(self, message: Dict):
+        """把回复交给等待者：优先匹配被回复的消息，只有一个等待者时普通消息也算"""
+        if str(message.get('chat', {}).get('id')) != str(self.chat_id):
+            return
+        text = (message.get('text') or '').strip()
+        if not text:
+            return
+
+        reply_to = (message.get('reply_to_message') or {}).get('message_id')
+        future = self.waiters.get(reply_to)
+        if future is None and len(self.waiters) == 1:
+            future = next(iter(self.waiters.values()))
+        if future and not future.done():
+            future.set_result(text)
+
+    async def close(self, timeout: float = 120):
+        """更新最终进度、发送完队列中剩余的消息后关闭连接池"""
+        for future in list(self.waiters.values()):
+            future.cancel()
+        if self.poller:
+            self.poller.cancel()
+            self.poller = None
+        if self.progress_task:
+            self.progress_task.cancel()
+            self.progress_task = None
+            await self.show_progress()
+        if self.worker:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f'⚠️ Telegram 队列中还有 {self.queue.qsize()} 条消息未发送，已放弃')
+            self.worker.cancel()
+            self.worker = None
+        if self.session:
+            await self.session.close()
+        self.session = None
+
+
+
+def format_to_iso(date):
+    """格式化日期为 ISO 格式字符串"""
+    return date.strftime('%Y-%m-%d %H:%M:%S')
+
+
+async def delay_time(ms):
+    """延时函数，单位毫秒"""
+    await asyncio.sleep(ms / 1000)
+
+
+class HostConcurrency:
+    """单个主机的并发状态"""
+
+    def __init__(self, limit: int):
+        self.limit = float(limit)  # 当前并发上限（取整后使用）
+        self.active = 0
+        self.cond = asyncio.Condition()
+        self.latency = None  # 正常登录耗时的平滑值
+        self.baseline = None  # 平滑耗时的最小值
+        self.samples = 0
+        self.decreased_at = 0.0  # 上次减半的时间
+
+
+class HostSlot:
+    """一次登录占用的名额：调用方把过载信号写入 overload；耗时不代表服务端负载时把 timed 设为 False"""
+
+    def __init__(self, limiter: Optional['HostLimiter'] = None, host: str = '',
+                 state: Optional['HostConcurrency'] = None):
+        self.started = None
+        self.overload = None
+        self.timed = True
+        self.limiter = limiter
+        self.host = host
+        self.state = state
+        self.host_held = False
+        self.global_held = False
+
+    async def give_back(self):
+        """
+        提前归还名额（例如开始等待人工验证），之后的步骤不再占用名额
+
+        归还后不再重新排队：调用方此时还占着浏览器上下文，重新等待名额会与正在等上下文的账号互相等待。
+        剩余耗时包含人工等待，不再用于调整并发。不属于任何限流器的名额（limiter 为 None）什么也不做
+        """
+        if self.limiter is None:
+            return
+        self.timed = False
+        await self.limiter.release(self)
+
+class HostLimiter:
+    """
+    按主机限流：全局并发上限 + 单主机并发上限
+
+    同一主机的两次请求之间保持随机间隔，不同主机之间互不等待。
+    开启 ADAPTIVE_CONCURRENCY 时单主机上限按 AIMD 自动调整：从 per_host_limit 开始，
+    每个正常完成的登录让上限增加 1/上限（每轮约 +1），直到 ADAPTIVE_MAX_PER_HOST 与全局上限；
+    出现超时、429/5xx、过载页面或耗时超过基线 ADAPTIVE_LATENCY_FACTOR 倍时上限减半（最低为 1），
+    减半之前已经开始的登录不会再次触发减半。每次调整都记录到运行指标中。
+    """
+
+    def __init__(self, global_limit: int, per_host_limit: int, delay_range: Tuple[int, int] = (0, 0),
+                 metrics: Optional['RunMetrics'] = None, provider: str = '', adaptive: bool = ADAPTIVE_CONCURRENCY):
+        self.global_sem = asyncio.Semaphore(max(1, global_limit))
+        self.per_host_limit = max(1, per_host_limit)
+        self.max_per_host = max(self.per_host_limit, min(ADAPTIVE_MAX_PER_HOST, global_limit)) if adaptive \
+            else self.per_host_limit
+        self.delay_range = delay_range
+        self.metrics = metrics
+        self.provider = provider
+        self.adaptive = adaptive
+        self.hosts = {}  # 主机 -> 并发状态
+        self.host_next_start = {}
+
+    async def _wait_turn(self, host: str):
+        """等待该主机的下一个可用时间点（预约制，无需加锁）"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self.host_next_start.get(host, now))
+        self.host_next_start[host] = start + random.randint(*self.delay_range) / 1000
+        if start > now:
+            print(f'{host}: 等待 {start - now:.1f} 秒后继续...')
+            await asyncio.sleep(start - now)
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        """
+        获取一个登录名额
+
+        先占用主机名额再占用全局名额，避免等待间隔时白占全局并发。
+        调用方在 with 块中把过载信号（例如 'HTTP 503'、'timeout'）写入 slot.overload，
+        退出时据此调整该主机的并发上限
+
+        Yields:
+            HostSlot: 本次登录的名额
+        """
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostConcurrency(self.per_host_limit)
+        slot = HostSlot(self, host, state)
+        try:
+            await self.acquire(slot)
+            slot.started = time.monotonic()
+            yield slot
+        finally:
+            if slot.started is not None:
+                self.adjust(host, state, slot)
+            await self.release(slot)
+
+    async def acquire(self, slot: 'HostSlot'):
+        """占用主机名额与全局名额"""
+        state = slot.state
+        async with state.cond:
+            await state.cond.wait_for(lambda: state.active < int(state.limit))
+            state.active += 1
+        slot.host_held = True
+        await self._wait_turn(slot.host)
+        await self.global_sem.acquire()
+        slot.global_held = True
+
+    async def release(self, slot: 'HostSlot'):
+        """归还名额中仍占用的部分（重复调用无影响）"""
+        if slot.global_held:
+            slot.global_held = False
+            self.global_sem.release()
+        if slot.host_held:
+            slot.host_held = False
+            async with slot.state.cond:
+                slot.state.active -= 1
+                slot.state.cond.notify_all()
+
+    def adjust(self, host: str, state: 'HostConcurrency', slot: 'HostSlot'):
+        """AIMD：根据本次登录的过载信号与耗时调整主机并发上限"""
+        latency = time.monotonic() - slot.started
+        signal = slot.overload
+        if not signal and slot.timed and state.baseline is not None and state.samples >= 3 \
+                and latency > state.baseline * ADAPTIVE_LATENCY_FACTOR:
+            signal = f'slow {latency:.1f}s'
+        if not signal and slot.timed:
+            # 只用正常的耗时更新基线：平滑值，基线取平滑值的最小值
+            state.latency = latency if state.latency is None else state.latency * 0.7 + latency * 0.3
+            state.baseline = state.latency if state.baseline is None else min(state.baseline, state.latency)
+            state.samples += 1
+        if not self.adaptive:
+            return
+
+        old = int(state.limit)
+        if signal:
+            if slot.started < state.decreased_at:
+                # 上次减半之前就已开始的登录，信号已经反映过了
+                return
+            state.limit = max(1.0, state.limit / 2)
+            state.decreased_at = time.monotonic()
+            decision = 'decrease'
+        else:
+            state.limit = min(float(self.max_per_host), state.limit + 1 / state.limit)
+            decision = 'increase'
+            if int(state.limit) == old:
+                return
+
+        if int(state.limit) != old:
+            print(f'{host}: 并发上限 {old} → {int(state.limit)}' + (f'（{signal}）' if signal else ''))
+        if self.metrics:
+            self.metrics.inc('concurrency_decisions', provider=self.provider, host=host, decision=decision)
+            self.metrics.set('concurrency_limit', int(state.limit), provider=self.provider, host=host)
+            self.metrics.event('concurrency', provider=self.provider, host=host, decision=decision,
+                               limit=int(state.limit), reason=signal or '')
+
+
+def is_timeout_error(e: Exception) -> bool:
+    """判断是否为超时异常（asyncio 与 Playwright 各有自己的 TimeoutError）"""
+    return isinstance(e, asyncio.TimeoutError) or type(e).__name__ == 'TimeoutError'
+
+
+async def first_of(*awaitables):
+    """
+    等待多个条件中最先满足的一个，其余条件立即取消
+
+    某个条件出错（例如页面跳转导致选择器等待失败）时继续等待其他条件，全部出错才抛出异常
+    """
+    tasks = [asyncio.ensure_future(a) for a in awaitables]
+    try:
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+            # 取走未完成条件的异常，避免 "Task exception was never retrieved" 警告
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+def url_key(url: str) -> str:
+    """URL 的域名 + 路径（小写，不含查询参数），用于 URL 片段匹配"""
+    parsed = urlparse(url or '')
+    return f'{parsed.netloc}{parsed.path}'.lower()
+
+
+def url_matches(page, include=(), exclude=()):
+    """
+    Playwright 条件：URL 包含 include 中任一片段且不包含 exclude 中任何片段
+
+    只匹配域名和路径，忽略查询参数（GitHub 登录页的 return_to 参数里就带有 oauth/authorize）。
+    当前 URL 已满足时立即返回
+    """
+    def predicate(url: str) -> bool:
+        url = url_key(url)
+        return (not include or any(p in url for p in include)) and not any(p in url for p in exclude)
+
+    return page.wait_for_url(predicate, wait_until='commit', timeout=0)
+
+
+def compile_indicators(indicators) -> Optional['re.Pattern']:
+    """把一组关键字编译成一个忽略大小写的多模式正则（同时可在页面内作为 JS RegExp 使用）"""
+    if not indicators:
+        return None
+    return re.compile('|'.join(re.escape(i) for i in indicators), re.IGNORECASE)
+
+
+class LoginDetector:
+    """
+    登录结果判断：一次页面内求值得到精简结论，不把整页 HTML 传回脚本
+
+    结论包含 登出元素是否存在、URL、标题，以及 URL/标题/页面内容中命中的成功或错误关键字；
+    成功关键字只与 URL 的路径匹配（域名本身可能含有 panel 之类的字样），需要按域名判断时使用 success_hosts。
+    判断优先级：登出元素 > URL > 标题 > 错误关键字 > 页面内容（页面内容中的成功关键字最弱，登录页本身也可能出现）。
+    scan() 对保存下来的 HTML 给出同样格式的结论，便于用固定样本验证判断逻辑
+    """
+
+    # 在页面内完成查找与匹配，只返回命中的关键字
+    SCRIPT = '''([logoutSelector, successSource, errorSource]) => {
+        const html = document.documentElement ? document.documentElement.outerHTML : '';
+        const find = (source) => {
+            if (!source) return null;
+            const match = html.match(new RegExp(source, 'i'));
+            return match ? match[0].toLowerCase() : null;
+        };
+        return {
+            logout: !!(logoutSelector && document.querySelector(logoutSelector)),
+            url: location.href,
+            title: document.title || '',
+            content_match: find(successSource),
+            error_match: find(errorSource),
+        };
+    }'''
+
+    def __init__(self, success=(), error=(), exclude=(), logout_selector: str = None, logout_re: str = None,
+                 scan_content: bool = True, success_hosts=()):
+        """
+        Args:
+            success: 成功关键字（匹配 URL 路径、标题与页面内容）
+            error: 错误关键字（仅在页面内容中查找）
+            exclude: URL 中出现即视为未完成的片段（例如 signin）
+            logout_selector: 登出元素的 CSS 选择器
+            logout_re: scan() 判断登出元素用的正则
+            scan_content: 是否在页面内容中查找关键字
+            success_hosts: 到达即视为成功的域名（包括其子域名）
+        """
+        self.success = compile_indicators(success)
+        self.success_hosts = tuple(host.lower() for host in success_hosts)
+        self.error = compile_indicators(error)
+        self.exclude = tuple(exclude)
+        self.logout_selector = logout_selector
+        self.logout_re = re.compile(logout_re) if logout_re else None
+        self.scan_content = scan_content
+
+    def match(self, pattern, text: str) -> Optional[str]:
+        """返回命中的关键字（小写）"""
+        found = pattern.search(text or '') if pattern else None
+        return found.group(0).lower() if found else None
+
+    def url_match(self, url: str) -> Optional[str]:
+        """URL 命中的成功指标：成功域名，或路径中的成功关键字；包含 exclude 片段时为 None"""
+        parsed = urlparse(url or '')
+        host = (parsed.hostname or '').lower()
+        if any(p in url_key(url) for p in self.exclude):
+            return None
+        for success_host in self.success_hosts:
+            if host == success_host or host.endswith('.' + success_host):
+                return success_host
+        return self.match(self.success, parsed.path.lower())
+
+    def url_ok(self, url: str) -> bool:
+        """URL 是否已到达成功页面（可直接作为 page.wait_for_url 的条件）"""
+        return self.url_match(url) is not None
+
+    def finish(self, verdict: Dict) -> Dict:
+        """补充 URL 与标题的匹配结果"""
+        verdict['url_match'] = self.url_match(verdict['url'])
+        verdict['title_match'] = self.match(self.success, verdict['title'])
+        return verdict
+
+    async def inspect(self, page) -> Dict:
+        """在页面内求值一次，返回结论"""
+        content = self.scan_content
+        verdict = await page.evaluate(self.SCRIPT, [
+            self.logout_selector,
+            self.success.pattern if content and self.success else None,
+            self.error.pattern if content and self.error else None,
+        ])
+        return self.finish(verdict)
+
+    def scan(self, html: str, url: str = '', title: str = '') -> Dict:
+        """对保存的 HTML 给出与 inspect() 相同格式的结论"""
+        content = self.scan_content
+        return self.finish({
+            'logout': bool(self.logout_re and self.logout_re.search(html or '')),
+            'url': url,
+            'title': title,
+            'content_match': self.match(self.success, html) if content else None,
+            'error_match': self.match(self.error, html) if content else None,
+        })
+
+    @staticmethod
+    def judge(verdict: Dict) -> Tuple[bool, str]:
+        """根据结论判断是否登录成功，并给出原因"""
+        if verdict['logout']:
+            return True, '✅ 检测到登出按钮，登录成功'
+        if verdict['url_match']:
+            return True, f'✅ URL 包含成功指标，登录成功: {verdict["url"]}'
+        if verdict['title_match']:
+            return True, f'✅ 页面标题包含成功指标，登录成功: {verdict["title"]}'
+        if verdict['error_match']:
+            return False, '❌ 页面包含错误信息，登录失败'
+        if verdict['content_match']:
+            return True, '✅ 页面内容包含成功指标，登录成功'
+        return False, f'⚠️ 无法确定登录状态，URL: {verdict["url"]}'
+
+
+class WaitEngine:
+    """
+    事件驱动的等待：条件满足立即继续，超过该步骤的时间预算则放弃
+
+    同时统计实际等待时间与原先固定延时的对比
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.waited = 0.0
+        self.legacy = 0.0
+
+    async def until(self, step: str, condition, timeout: float, legacy: float = 0.0, log=None) -> bool:
+        """
+        等待条件满足
+
+        Args:
+            step: 步骤名称（用于日志）
+            condition: 条件满足时完成的 awaitable
+            timeout: 该步骤的时间预算（秒）
+            legacy: 原先在此处的固定延时（秒），仅用于统计
+            log: 日志函数，默认 print
+
+        Returns:
+            bool: 条件是否在预算内满足
+        """
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(condition, timeout)
+            ok = True
+        except Exception as e:
+            if not is_timeout_error(e):
+                raise
+            ok = False
+
+        elapsed = time.monotonic() - start
+        self.count += 1
+        self.waited += elapsed
+        self.legacy += legacy
+        (log or print)(f"⏱ {step}: 等待 {elapsed:.1f} 秒{'' if ok else '（超时）'}，原固定延时 {legacy:g} 秒")
+        return ok
+
+    def summary(self) -> str:
+        """汇总等待耗时"""
+        return (f'{self.name} 等待统计: {self.count} 次等待，实际 {self.waited:.1f} 秒，'
+                f'原固定延时 {self.legacy:.1f} 秒')
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩百分位数（q 取 0-1）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class StepTimer:
+    """
+    单个账号的分段计时：step() 结束上一段并开始新的一段，finish() 结束最后一段
+
+    适合按顺序执行的登录流程，不需要为每一步单独缩进 with 语句
+    """
+
+    def __init__(self, metrics: 'RunMetrics', provider: str, account: str):
+        self.metrics = metrics
+        self.provider = provider
+        self.account = account
+        self.started = time.monotonic()
+        self.current = None
+        self.current_start = 0.0
+
+    def step(self, name: str):
+        """开始新的一段（上一段记为成功）"""
+        self.end(True)
+        self.current = name
+        self.current_start = time.monotonic()
+
+    def end(self, ok: bool):
+        """结束当前段"""
+        if self.current:
+            self.metrics.record(self.provider, self.current, self.account,
+                                time.monotonic() - self.current_start, ok)
+            self.current = None
+
+    def finish(self, ok: bool):
+        """结束整个账号：失败时最后一段记为失败，并记录账号总耗时"""
+        self.end(ok)
+        self.metrics.record(self.provider, 'total', self.account, time.monotonic() - self.started, ok)
+        self.metrics.first_login(self.provider)
+
+
+class RunMetrics:
+    """
+    整次运行的指标：每个步骤的耗时分段，以及按标签区分的计数/数值
+
+    运行结束时导出为 JSON 与 Prometheus textfile
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.spans = []
+        self.values = {}
+        self.events = []
+
+    def record(self, provider: str, step: str, account: str, duration: float, ok: bool = True):
+        """记录一个步骤耗时"""
+        self.spans.append({
+            'provider': provider,
+            'step': step,
+            'account': account,
+            'duration': round(duration, 4),
+            'ok': ok,
+        })
+
+    @contextmanager
+    def span(self, provider: str, step: str, account: str = ''):
+        """用 with 包裹单个步骤计时，抛出异常时记为失败"""
+        start = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(provider, step, account, time.monotonic() - start, ok)
+
+    def timer(self, provider: str, account: str) -> StepTimer:
+        """创建账号的分段计时器"""
+        return StepTimer(self, provider, account)
+
+    def first_login(self, provider: str):
+        """记录提供商第一个账号完成登录的时间（距进程启动）"""
+        key = ('time_to_first_login_seconds', (('provider', provider),))
+        if key not in self.values:
+            self.values[key] = round(time.monotonic() - PROCESS_STARTED, 4)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """累加计数"""
+        key = (name, tuple(sorted(labels.items())))
+        self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        """设置数值"""
+        self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def event(self, name: str, **fields):
+        """记录一条运行事件（例如并发调整），只导出到 JSON"""
+        self.events.append({'time': round(time.time() - self.started_at, 3), 'event': name, **fields})
+
+    def summary(self) -> List[Dict]:
+        """按 提供商 + 步骤 汇总 p50/p95"""
+        groups = {}
+        for span in self.spans:
+            groups.setdefault((span['provider'], span['step']), []).append(span)
+
+        rows = []
+        for (provider, step), spans in sorted(groups.items()):
+            durations = [s['duration'] for s in spans]
+            rows.append({
+                'provider': provider,
+                'step': step,
+                'count': len(spans),
+                'failures': sum(1 for s in spans if not s['ok']),
+                'p50': percentile(durations, 0.5),
+                'p95': percentile(durations, 0.95),
+                'max': max(durations),
+                'sum': round(sum(durations), 4),
+            })
+        return rows
+
+    def to_json(self) -> Dict:
+        """导出为 JSON 结构"""
+        return {
+            'started_at': self.started_at,
+            'duration': round(time.time() - self.started_at, 4),
+            'summary': self.summary(),
+            'spans': self.spans,
+            'values': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self.values.items())
+            ],
+            'events': self.events,
         }
 
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus textfile 格式"""
+        def fmt_labels(labels: Dict) -> str:
+            if not labels:
+                return ''
+            escaped = []
+            for key, value in labels.items():
+                value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+                escaped.append(f'{key}="{value}"')
+            return '{' + ','.join(escaped) + '}'
+
+        lines = [
+            '# HELP keepalive_step_duration_seconds Login step duration per provider.',
+            '# TYPE keepalive_step_duration_seconds summary',
+        ]
+        rows = self.summary()
+        for row in rows:
+            labels = {'provider': row['provider'], 'step': row['step']}
+            for q in ('0.5', '0.95'):
+                value = row['p50'] if q == '0.5' else row['p95']
+                lines.append(f'keepalive_step_duration_seconds{fmt_labels({**labels, "quantile": q})} {value}')
+            lines.append(f'keepalive_step_duration_seconds_sum{fmt_labels(labels)} {row["sum"]}')
+            lines.append(f'keepalive_step_duration_seconds_count{fmt_labels(labels)} {row["count"]}')
+
+        lines.append('# HELP keepalive_step_failures_total Failed login steps per provider.')
+        lines.append('# TYPE keepalive_step_failures_total counter')
+        for row in rows:
+            labels = {'provider': row['provider'], 'step': row['step']}
+            lines.append(f'keepalive_step_failures_total{fmt_labels(labels)} {row["failures"]}')
+
+        for name in sorted({name for name, _ in self.values}):
+            lines.append(f'# TYPE keepalive_{name} gauge')
+            for (value_name, labels), value in sorted(self.values.items()):
+                if value_name == name:
+                    lines.append(f'keepalive_{name}{fmt_labels(dict(labels))} {value}')
+
+        lines.append('# TYPE keepalive_run_duration_seconds gauge')
+        lines.append(f'keepalive_run_duration_seconds {round(time.time() - self.started_at, 4)}')
+        lines.append('# TYPE keepalive_run_timestamp_seconds gauge')
+        lines.append(f'keepalive_run_timestamp_seconds {int(self.started_at)}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, json_path: str = METRICS_JSON_PATH, prom_path: str = METRICS_PROM_PATH):
+        """写出 JSON 与 Prometheus textfile，并打印最慢的步骤"""
+        if not self.spans and not self.values:
+            return
+
+        for path, content in ((json_path, json.dumps(self.to_json(), ensure_ascii=False, indent=2)),
+                              (prom_path, self.to_prometheus())):
+            if not path:
+                continue
+            try:
+                tmp_path = f'{path}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f'写入运行指标 {path} 失败: {e}')
+
+        slowest = sorted((r for r in self.summary() if r['step'] != 'total'), key=lambda r: r['p95'], reverse=True)
+        if slowest:
+            print('最慢的步骤 (p95):')
+            for row in slowest[:5]:
+                print(f"  {row['provider']}/{row['step']}: p50 {row['p50']:.2f}s, p95 {row['p95']:.2f}s ({row['count']} 次)")
+
+
+def deadline_left() -> float:
+    """距离整次运行截止时间的剩余秒数"""
+    return PROCESS_STARTED + RUN_DEADLINE_MINUTES * 60 - time.monotonic()
+
+
+class RetryPolicy:
+    """
+    账号级重试：只有临时性失败（超时、网络错误等）才重试
+
+    重试前按指数退避 + 随机抖动等待，等待期间不占用登录名额，其他账号照常进行；
+    所有尝试都受整次运行的截止时间约束，到点后不再开始新的尝试并中止进行中的登录
+    """
+
+    def __init__(self, metrics: RunMetrics, provider: str, max_attempts: int = RETRY_MAX_ATTEMPTS,
+                 base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY):
+        self.metrics = metrics
+        self.provider = provider
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间：上限内指数增长，取一半固定 + 一半随机"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def run(self, label: str, attempt) -> Tuple[bool, Optional[str], int]:
+        """
+        执行带重试的登录
+
+        Args:
+            label: 账号名称（用于日志）
+            attempt: attempt(last) 执行一次登录，返回 (是否成功, 失败类型)；last 表示是否为最后一次尝试
+
+        Returns:
+            Tuple[bool, Optional[str], int]: (最终是否登录成功, 最后一次的失败类型, 尝试次数)
+        """
+        failure = None
+        for n in range(1, self.max_attempts + 1):
+            remaining = deadline_left()
+            if remaining <= 0:
+                print(f'⏰ 已到运行截止时间，跳过 {label}')
+                self.metrics.inc('deadline_skipped', provider=self.provider)
+                return False, failure or FAILURE_DEADLINE, n - 1
+
+            try:
+                ok, failure = await asyncio.wait_for(attempt(n == self.max_attempts), remaining)
+            except asyncio.TimeoutError:
+                print(f'⏰ 已到运行截止时间，中止 {label}')
+                self.metrics.inc('deadline_aborted', provider=self.provider)
+                return False, FAILURE_DEADLINE, n
+
+            if ok:
+                return True, None, n
+            self.metrics.inc('login_failures', provider=self.provider, failure=failure)
+            if failure != FAILURE_TRANSIENT or n == self.max_attempts:
+                return False, failure, n
+
+            delay = self.backoff(n)
+            if delay >= deadline_left():
+                return False, failure, n
+            print(f'🔁 {label} 第 {n} 次尝试失败（{failure}），{delay:.1f} 秒后重试')
+            self.metrics.inc('login_retries', provider=self.provider)
+            await asyncio.sleep(delay)
+        return False, failure, self.max_attempts
+
+
+class ResourceFilter:
+    """
+    请求拦截：丢弃图片、字体、媒体与常见统计/追踪域名的请求
+
+    保活只需要 HTML 与脚本，这些资源既拖慢页面加载也浪费流量。
+    每个提供商有自己的放行列表（例如验证码服务必须能加载）。
+    被拦截请求的字节数无法得知，按资源类型的典型大小估算。
+    """
+
+    def __init__(self, provider: str, metrics: RunMetrics, allowlist: Tuple[str, ...] = ()):
+        self.provider = provider
+        self.metrics = metrics
+        self.allowlist = allowlist
+        self.enabled = BLOCK_RESOURCES
+        self.blocked = {}
+        self.blocked_bytes = 0
+        self.allowed = 0
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        """判断请求是否需要拦截"""
+        host = urlparse(url).hostname or ''
+        if any(host == h or host.endswith('.' + h) for h in self.allowlist):
+            return False
+        if resource_type in BLOCKED_RESOURCE_TYPES:
+            return True
+        return any(host == h or host.endswith('.' + h) for h in BLOCKED_HOSTS)
+
+    def check(self, url: str, resource_type: str) -> bool:
+        """判断并计数，返回是否拦截"""
+        if not self.should_block(url, resource_type):
+            self.allowed += 1
+            return False
+        self.blocked[resource_type] = self.blocked.get(resource_type, 0) + 1
+        self.blocked_bytes += RESOURCE_SIZE_ESTIMATE.get(resource_type, RESOURCE_SIZE_ESTIMATE['other'])
+        return True
+
+    async def attach_playwright(self, context):
+        """为 Playwright 浏览器上下文安装拦截规则"""
+        if not self.enabled:
+            return
+
+        async def handle(route):
+            request = route.request
+            if self.check(request.url, request.resource_type):
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await context.route('**/*', handle)
+
+    def report(self):
+        """打印并记录拦截统计"""
+        if not self.enabled:
+            return
+
+        total = sum(self.blocked.values())
+        for resource_type, count in sorted(self.blocked.items()):
+            self.metrics.set('blocked_requests', count, provider=self.provider, type=resource_type)
+        self.metrics.set('blocked_bytes_estimate', self.blocked_bytes, provider=self.provider)
+        self.metrics.set('allowed_requests', self.allowed, provider=self.provider)
+        print(f'{self.provider} 资源拦截: 拦截 {total} 个请求（约 {self.blocked_bytes / 1024 / 1024:.1f} MB），放行 {self.allowed} 个')
+
+
+def process_tree_rss_mb() -> Optional[float]:
+    """当前进程所有子孙进程（Playwright 驱动与浏览器各进程）的常驻内存合计（MB），无法读取 /proc 时返回 None"""
+    if not os.path.isdir('/proc'):
+        return None
+    children = {}
+    rss = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/stat', 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 进程名中可能有空格，从最后一个 ')' 之后开始取字段：ppid 为第 2 个，rss（页数）为第 22 个
+        fields = stat[stat.rindex(')') + 2:].split()
+        children.setdefault(int(fields[1]), []).append(int(pid))
+        rss[int(pid)] = int(fields[21])
+
+    total = 0
+    stack = list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack += children.get(pid, [])
+    return total * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+class BrowserDriver:
+    """
+    共享浏览器驱动：同一时间只运行一个 Playwright Chromium
+
+    Serv00 与 ClawCloud 共用这一个浏览器进程，每个账号使用独立的浏览器上下文（cookie 互不共享）。
+    页面对象即 Playwright 的 Page，提供 goto / fill / click / wait_for_* / screenshot 等操作。
+    同时打开的上下文数受 BROWSER_MAX_CONTEXTS 与内存预算 BROWSER_MEMORY_MB 共同限制，超出时排队等待。
+
+    lease() 从页面池中取出预热好的页面，用完后清空 cookie 与存储再放回池中。
+    浏览器服务满 BROWSER_RECYCLE_ACCOUNTS 个账号或内存超过 BROWSER_RECYCLE_RSS_MB 时，
+    新的账号改用新启动的浏览器，旧浏览器在其上的账号全部结束后关闭；浏览器崩溃时下次使用自动重新启动。
+    """
+
+    def __init__(self, metrics: RunMetrics):
+        self.metrics = metrics
+        self.playwright = None
+        self.browser = None
+        self.lock = asyncio.Lock()
+        self.max_contexts = max(1, min(BROWSER_MAX_CONTEXTS, BROWSER_MEMORY_MB // BROWSER_CONTEXT_MEMORY_MB))
+        self.context_slots = asyncio.Semaphore(self.max_contexts)
+        self.open_contexts = {}  # 浏览器 -> 未关闭的上下文数
+        self.pooled = set()  # 属于页面池的上下文
+        self.idle = []  # [(资源拦截规则, 页面)] 可以直接使用的空闲页面
+        self.crashed = set()  # 渲染进程崩溃的页面
+        self.served = 0  # 当前浏览器已服务的账号数
+        self.peak_rss = 0.0
+        self.closing = set()  # 正在关闭的旧浏览器
+        self.metrics.set('browser_context_budget', self.max_contexts)
+
+    async def get_browser(self):
+        """获取共享浏览器（首次调用或浏览器已退役、崩溃时启动，并发调用只会启动一次；未安装 playwright 时抛出 ImportError）"""
+        async with self.lock:
+            if not self.browser or not self.browser.is_connected():
+                with self.metrics.span('driver', 'browser_launch'):
+                    if not self.playwright:
+                        from playwright.async_api import async_playwright
+
+                        self.playwright = await async_playwright().start()
+                    browser = await self.playwright.chromium.launch(
+                        headless=True,
+                        args=['--no-sandbox', '--disable-setuid-sandbox']
+                    )
+                browser.on('disconnected', self.on_disconnected)
+                self.browser = browser
+                self.open_contexts[browser] = 0
+                self.served = 0
+        return self.browser
+
+    def on_disconnected(self, browser):
+        """浏览器进程退出：如果是当前浏览器，说明崩溃了，下次使用时重新启动"""
+        self.open_contexts.pop(browser, None)
+        if browser is self.browser:
+            print('⚠️ 浏览器进程意外退出，将在下次使用时重新启动')
+            self.metrics.inc('browser_crashes')
+            self.browser = None
+
+    async def new_context(self, resources: Optional[ResourceFilter] = None, cookies: Optional[List[Dict]] = None,
+                          **options):
+        """
+        创建独立的浏览器上下文，调用方用完后负责 close()（关闭时归还预算名额）
+
+        Args:
+            resources: 资源拦截规则（可选）
+            cookies: 预先写入的 cookie（可选）
+            **options: 传给 browser.new_context 的参数，例如 storage_state、viewport
+
+        Returns:
+            BrowserContext: 新的浏览器上下文
+        """
+        browser = await self.get_browser()
+        options.setdefault('user_agent', BROWSER_USER_AGENT)
+        # 名额被空闲页面占满时先关闭空闲页面，避免池中的页面挡住正在等待的账号
+        while self.context_slots.locked() and self.idle:
+            _, page = self.idle.pop(0)
+            await self.discard(page)
+        await self.context_slots.acquire()
         try:
-            response = requests.post(url, json=payload, timeout=30)
-            if response.status_code == 200:
-                print('✅ Telegram 消息发送成功')
+            context = await browser.new_context(**options)
+        except BaseException:
+            self.context_slots.release()
+            raise
+        self.open_contexts[browser] = self.open_contexts.get(browser, 0) + 1
+        context.on('close', lambda _: self.on_context_closed(browser, context))
+        if resources:
+            await resources.attach_playwright(context)
+        if cookies:
+            await context.add_cookies(playwright_cookies(cookies))
+        return context
+
+    def on_context_closed(self, browser, context):
+        """上下文关闭：归还名额；不属于页面池的上下文对应一个账号结束"""
+        self.context_slots.release()
+        if context in self.pooled:
+            self.pooled.discard(context)
+        else:
+            self.account_done(browser)
+        if browser in self.open_contexts:
+            self.open_contexts[browser] -= 1
+            if browser is not self.browser and self.open_contexts[browser] <= 0:
+                self.close_later(browser)
+
+    def account_done(self, browser):
+        """一个账号用完浏览器：检查是否需要换用新的浏览器进程"""
+        if browser is not self.browser:
+            return
+        self.served += 1
+        reason = None
+        if BROWSER_RECYCLE_ACCOUNTS and self.served >= BROWSER_RECYCLE_ACCOUNTS:
+            reason = f'已服务 {self.served} 个账号'
+        elif BROWSER_RECYCLE_RSS_MB:
+            rss = process_tree_rss_mb()
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss, rss)
+                self.metrics.set('browser_peak_rss_mb', round(self.peak_rss, 1))
+                if rss > BROWSER_RECYCLE_RSS_MB:
+                    reason = f'内存占用 {rss:.0f} MB'
+        if not reason:
+            return
+
+        print(f'♻️ 浏览器{reason}，后续账号使用新的浏览器进程')
+        self.metrics.inc('browser_recycles')
+        self.browser = None
+        for entry in [entry for entry in self.idle if entry[1].context.browser is browser]:
+            self.idle.remove(entry)
+            asyncio.get_running_loop().create_task(self.discard(entry[1]))
+        if self.open_contexts.get(browser, 0) <= 0:
+            self.close_later(browser)
+
+    def close_later(self, browser):
+        """在后台关闭已退役的浏览器"""
+        self.open_contexts.pop(browser, None)
+
+        async def close_browser():
+            try:
+                await browser.close()
+            except Exception as e:
+                print(f'关闭旧浏览器时出错: {e}')
+
+        task = asyncio.get_running_loop().create_task(close_browser())
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+
+    async def new_page(self, resources: Optional[ResourceFilter] = None):
+        """为页面池创建一个上下文和页面"""
+        context = await self.new_context(resources)
+        self.pooled.add(context)
+        page = await context.new_page()
+        page.on('crash', lambda _: self.crashed.add(page))
+        return page
+
+    async def discard(self, page):
+        """关闭池中的页面及其上下文"""
+        self.crashed.discard(page)
+        try:
+            await page.context.close()
+        except Exception:
+            pass
+
+    async def prewarm(self, resources: Optional[ResourceFilter] = None, count: int = BROWSER_POOL_SIZE):
+        """预先启动浏览器并创建若干空闲页面（失败只打印，不影响登录）"""
+        try:
+            while len(self.idle) < count and not self.context_slots.locked():
+                self.idle.append((resources, await self.new_page(resources)))
+        except Exception as e:
+            print(f'预热浏览器页面失败: {e}')
+
+    @asynccontextmanager
+    async def lease(self, resources: Optional[ResourceFilter] = None, cookies: Optional[List[Dict]] = None):
+        """
+        从页面池取出一个干净的页面，用完后重置状态放回池中
+
+        页面崩溃、浏览器退出或已退役时不放回，直接关闭；浏览器崩溃只影响正在使用它的账号
+
+        Args:
+            resources: 资源拦截规则（同一规则的页面才会复用）
+            cookies: 预先写入的 cookie（可选）
+
+        Yields:
+            Page: 空白页面，page.context 为其上下文
+        """
+        page = None
+        while self.idle and page is None:
+            owner, candidate = self.idle.pop()
+            if (owner is resources and candidate not in self.crashed and not candidate.is_closed()
+                    and candidate.context.browser is self.browser and self.browser.is_connected()):
+                page = candidate
+                self.metrics.inc('browser_pool_hits')
+            else:
+                await self.discard(candidate)
+        if page is None:
+            page = await self.new_page(resources)
+        browser = page.context.browser
+
+        try:
+            if cookies:
+                await page.context.add_cookies(playwright_cookies(cookies))
+            yield page
+        finally:
+            self.account_done(browser)
+            reusable = (page not in self.crashed and not page.is_closed() and browser is self.browser
+                        and browser.is_connected() and len(self.idle) < BROWSER_POOL_SIZE)
+            if page in self.crashed:
+                print('⚠️ 浏览器页面崩溃，已关闭该页面')
+                self.metrics.inc('browser_page_crashes')
+            if reusable:
+                try:
+                    # 清空上一个账号的 cookie 与当前站点的存储，回到空白页
+                    await page.evaluate('() => { try { localStorage.clear(); sessionStorage.clear(); } catch (e) {} }')
+                    await page.context.clear_cookies()
+                    await page.goto('about:blank')
+                except Exception:
+                    reusable = False
+            if reusable:
+                self.idle.append((resources, page))
             else:
-                print(f"❌ 发送 Telegram 消息失败: {response.status_code} - {response.text}")
+                await self.discard(page)
+
+    async def release_idle(self, resources: Optional[ResourceFilter] = None):
+        """关闭属于某个资源拦截规则的空闲页面，把名额让给其他提供商"""
+        for entry in [entry for entry in self.idle if entry[0] is resources]:
+            self.idle.remove(entry)
+            await self.discard(entry[1])
+
+    async def close(self):
+        """关闭空闲页面、浏览器与 Playwright"""
+        for _, page in self.idle:
+            await self.discard(page)
+        self.idle = []
+        if self.closing:
+            await asyncio.gather(*self.closing, return_exceptions=True)
+        browser, self.browser = self.browser, None
+        if browser:
+            try:
+                await browser.close()
+            except Exception as e:
+                print(f'关闭浏览器时出错: {e}')
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+
+
+def playwright_cookies(cookies: List[Dict]) -> List[Dict]:
+    """整理缓存中的 cookie，只保留 Playwright add_cookies 接受的字段（兼容旧版 pyppeteer 缓存）"""
+    allowed = ('name', 'value', 'domain', 'path', 'expires', 'httpOnly', 'secure', 'sameSite')
+    result = []
+    for cookie in cookies:
+        cookie = {k: v for k, v in cookie.items() if k in allowed}
+        if cookie.get('sameSite') not in ('Strict', 'Lax', 'None'):
+            cookie.pop('sameSite', None)
+        cookie.setdefault('path', '/')
+        result.append(cookie)
+    return result
+
+
+class SessionCache:
+    """
+    登录会话磁盘缓存（按 提供商 + 账号 区分）
+
+    ClawCloud 保存 Playwright 的 storage_state，Serv00 保存浏览器上下文的 cookies。
+    条目过期或被服务端拒绝后自动删除；配置 SESSION_CACHE_KEY 后使用 Fernet 加密存储。
+    未配置密钥时明文保存，但去掉 GitHub 的 cookie（user_session 可以直接登录 GitHub 账号），
+    缓存的 ClawCloud 会话失效后需要重新走 GitHub 登录。
+    """
+
+    def __init__(self, directory: str = SESSION_CACHE_DIR, ttl_days: float = SESSION_CACHE_TTL_DAYS,
+                 secret: Optional[str] = SESSION_CACHE_KEY, enabled: bool = SESSION_CACHE_ENABLED):
+        self.directory = directory
+        self.ttl = ttl_days * 86400
+        self.enabled = enabled
+        self.fernet = None
+        self.warned = False
+
+        if self.enabled and secret:
+            try:
+                from cryptography.fernet import Fernet
+                key = base64.urlsafe_b64encode(hashlib.sha256(secret.encode('utf-8')).digest())
+                self.fernet = Fernet(key)
+            except ImportError:
+                # 配置了密钥却无法加密时宁可不缓存，也不明文落盘
+                print('⚠️ 未安装 cryptography，无法加密会话缓存，已禁用会话缓存')
+                self.enabled = False
+
+    def _path(self, provider: str, account: str) -> str:
+        """缓存文件路径（文件名使用哈希，不暴露账号名）"""
+        digest = hashlib.sha256(f'{provider}:{account}'.encode('utf-8')).hexdigest()[:24]
+        suffix = 'bin' if self.fernet else 'json'
+        return os.path.join(self.directory, f'{provider}_{digest}.{suffix}')
+
+    def load(self, provider: str, account: str):
+        """读取未过期的缓存会话，不存在、已过期或无法解析时返回 None"""
+        if not self.enabled:
+            return None
+
+        path = self._path(provider, account)
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            if self.fernet:
+                raw = self.fernet.decrypt(raw)
+            entry = json.loads(raw)
+        except FileNotFoundError:
+            return None
         except Exception as e:
-            print(f"❌ 发送 Telegram 消息时出错: {e}")
+            print(f'读取会话缓存失败，已丢弃: {e}')
+            self.invalidate(provider, account)
+            return None
+
+        if time.time() - entry.get('saved_at', 0) > self.ttl:
+            self.invalidate(provider, account)
+            return None
+        return entry.get('data')
+
+    def save(self, provider: str, account: str, data):
+        """写入会话缓存（先写临时文件再替换，避免中断时留下半个文件）"""
+        if not self.enabled or not data:
+            return
+
+        if not self.fernet:
+            data = self.strip_sensitive(data)
+        raw = json.dumps({'saved_at': time.time(), 'data': data}).encode('utf-8')
+        if self.fernet:
+            raw = self.fernet.encrypt(raw)
 
-    def send_photo(self, photo_path: str, caption: str = ""):
-        """发送图片"""
-        if not self.enabled or not os.path.exists(photo_path):
+        path = self._path(provider, account)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(raw)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f'写入会话缓存失败: {e}')
+
+    def strip_sensitive(self, data):
+        """去掉 SESSION_PLAINTEXT_EXCLUDE 中域名的 cookie 与 localStorage（data 为 storage_state 或 cookie 列表）"""
+        def excluded(domain: str) -> bool:
+            domain = (domain or '').lstrip('.').lower()
+            return any(domain == d or domain.endswith('.' + d) for d in SESSION_PLAINTEXT_EXCLUDE)
+
+        if isinstance(data, dict):
+            cookies = data.get('cookies') or []
+            origins = data.get('origins') or []
+            kept = dict(data, cookies=[c for c in cookies if not excluded(c.get('domain'))],
+                        origins=[o for o in origins if not excluded(urlparse(o.get('origin', '')).hostname)])
+            removed = len(cookies) - len(kept['cookies']) + len(origins) - len(kept['origins'])
+        elif isinstance(data, list):
+            kept = [c for c in data if not (isinstance(c, dict) and excluded(c.get('domain')))]
+            removed = len(data) - len(kept)
+        else:
+            return data
+
+        if removed and not self.warned:
+            self.warned = True
+            print('⚠️ 未配置 SESSION_CACHE_KEY，会话缓存以明文保存，已去掉 GitHub 的 cookie；'
+                  '建议配置 SESSION_CACHE_KEY 加密缓存')
+        return kept
+
+    def invalidate(self, provider: str, account: str):
+        """删除缓存会话"""
+        try:
+            os.remove(self._path(provider, account))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f'删除会话缓存失败: {e}')
+
+
+class AccountState:
+    """
+    账号状态存储（JSON Lines 文件，可随 Actions 缓存保留）
+
+    记录每个账号最近一次成功、最近一次失败、连续失败次数与平均耗时。每个账号完成后立即追加一行并落盘，
+    运行中断后重新运行时，最近已成功的账号会被跳过，只重试失败与未完成的账号；close() 时压缩为每个账号一行。
+    账号名只以哈希形式保存。
+    """
+
+    def __init__(self, path: str = STATE_FILE, fresh_hours: float = STATE_FRESH_HOURS, enabled: bool = STATE_ENABLED):
+        self.path = path
+        self.fresh = fresh_hours * 3600
+        self.enabled = enabled
+        self.accounts = {}
+        self.file = None
+        if self.enabled:
+            self.load()
+
+    @staticmethod
+    def _id(provider: str, account: str) -> str:
+        """账号标识（哈希，不暴露账号名）"""
+        return hashlib.sha256(f'{provider}:{account}'.encode('utf-8')).hexdigest()[:24]
+
+    def load(self):
+        """读取状态文件（中断时写了一半的最后一行会被忽略）"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.apply(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f'读取账号状态失败: {e}')
+
+    def apply(self, entry: Dict):
+        """合并一行记录：'ok' 为单次结果，否则为压缩后的完整状态"""
+        if 'ok' not in entry:
+            self.accounts[entry['id']] = entry
             return
 
-        url = f"https://api.telegram.org/bot{self.token}/sendPhoto"
+        state = self.accounts.setdefault(entry['id'], {
+            'id': entry['id'],
+            'provider': entry['provider'],
+            'last_success': None,
+            'last_failure': None,
+            'failure_streak': 0,
+            'avg_duration': None,
+        })
+        if entry['ok']:
+            state['last_success'] = entry['time']
+            state['failure_streak'] = 0
+        else:
+            state['last_failure'] = entry['time']
+            state['failure_streak'] += 1
+        if entry.get('duration') is not None:
+            # 指数滑动平均，近几次的耗时权重更高
+            old = state['avg_duration']
+            state['avg_duration'] = round(entry['duration'] if old is None else 0.7 * old + 0.3 * entry['duration'], 3)
+
+    def get(self, provider: str, account: str) -> Optional[Dict]:
+        """账号状态，没有记录时返回 None"""
+        return self.accounts.get(self._id(provider, account))
+
+    def is_fresh(self, provider: str, account: str) -> bool:
+        """最近一次结果是成功且仍在有效期内"""
+        state = self.get(provider, account)
+        if not self.enabled or not state or not state['last_success']:
+            return False
+        if state['last_failure'] and state['last_failure'] > state['last_success']:
+            return False
+        return time.time() - state['last_success'] < self.fresh
+
+    def record(self, provider: str, account: str, ok: bool, duration: Optional[float] = None):
+        """记录一次登录结果并立即落盘"""
+        if not self.enabled:
+            return
 
+        entry = {
+            'id': self._id(provider, account),
+            'provider': provider,
+            'time': round(time.time(), 3),
+            'ok': bool(ok),
+            'duration': round(duration, 3) if duration is not None else None,
+        }
+        self.apply(entry)
         try:
-            with open(photo_path, 'rb') as f:
-                files = {'photo': f}
-                data = {'chat_id': self.chat_id, 'caption': caption[:1024]}
-                response = requests.post(url, data=data, files=files, timeout=60)
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except Exception as e:
+            print(f'写入账号状态失败: {e}')
+
+    def close(self):
+        """关闭文件并压缩为每个账号一行"""
+        if self.file:
+            self.file.close()
+            self.file = None
+        if not self.enabled or not self.accounts:
+            return
 
-                if response.status_code != 200:
-                    print(f"发送图片失败: {response.text}")
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for state in self.accounts.values():
+                    f.write(json.dumps(state) + '\n')
+            os.replace(tmp_path, self.path)
         except Exception as e:
-            print(f"发送图片时出错: {e}")
+            print(f'压缩账号状态失败: {e}')
+
+
+class ResultSink:
+    """
+    登录结果流（JSON Lines）
+
+    每个账号完成时追加一行（提供商、账号、结果、失败类型、耗时、截图引用），先写入内存缓冲区，
+    由后台任务每隔 flush_interval 秒或攒够 flush_lines 行时异步写盘，close() 时写完并 fsync。
+    汇总通知与分片合并都从这个结果流生成。path 为空时只保存在内存中
+    """
+
+    def __init__(self, path: Optional[str] = RESULTS_FILE, shard: Optional[Tuple[int, int]] = None,
+                 flush_interval: float = 1.0, flush_lines: int = 50):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_lines = flush_lines
+        self.records = []
+        self.subscribers = []
+        self.buffer = []
+        self.file = None
+        self.flusher = None
+        self.flushes = set()  # 攒够行数时启动的写盘任务
+        self.closing = False
+        self.lock = asyncio.Lock()
+        self.append({'event': 'run', 'shard': list(shard) if shard else None, 'started_at': round(time.time(), 3)})
+
+    def append(self, record: Dict):
+        """记录一行，通知订阅者，并安排异步写盘"""
+        self.records.append(record)
+        for callback in self.subscribers:
+            callback(record)
+        if not self.path:
+            return
+        self.buffer.append(json.dumps(record, ensure_ascii=False) + '\n')
+        if self.closing:
+            # close() 会写完缓冲区，不再启动新的写盘任务
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if len(self.buffer) >= self.flush_lines:
+            task = loop.create_task(self.flush())
+            self.flushes.add(task)
+            task.add_done_callback(self.flushes.discard)
+        if self.flusher is None:
+            self.flusher = loop.create_task(self.run_flusher())
+
+    def subscribe(self, callback):
+        """每记录一行时调用 callback(record)"""
+        self.subscribers.append(callback)
+
+    def write(self, provider: str, account: str, outcome: str, failure: Optional[str] = None,
+              duration: Optional[float] = None, screenshot: Optional[Dict] = None, **extra):
+        """
+        记录一个账号的最终结果
 
+        Args:
+            provider: 提供商（serv00 / clawcloud）
+            account: 账号名
+            outcome: success / failure / skipped
+            failure: 失败类型
+            duration: 各次尝试的总耗时（秒）
+            screenshot: 截图引用（名称、大小与哈希，截图本身只发送到 Telegram）
+            **extra: 其他字段，例如 panel、attempts
+        """
+        self.append({
+            'event': 'account',
+            'time': round(time.time(), 3),
+            'provider': provider,
+            'account': account,
+            'outcome': outcome,
+            'failure': failure,
+            'duration': round(duration, 3) if duration is not None else None,
+            'screenshot': screenshot,
+            **extra,
+        })
+
+    def error(self, provider: str, error: str):
+        """记录提供商级别的错误"""
+        self.append({'event': 'error', 'time': round(time.time(), 3), 'provider': provider, 'error': error})
+
+    async def run_flusher(self):
+        """后台定期写盘"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """把缓冲区写入文件"""
+        async with self.lock:
+            if not self.buffer:
+                return
+            lines, self.buffer = self.buffer, []
+            try:
+                if self.file is None:
+                    import aiofiles
 
-def format_to_iso(date):
-    """格式化日期为 ISO 格式字符串"""
-    return date.strftime('%Y-%m-%d %H:%M:%S')
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    self.file = await aiofiles.open(self.path, mode='w', encoding='utf-8')
+                await self.file.write(''.join(lines))
+                await self.file.flush()
+            except Exception as e:
+                print(f'写入结果文件失败: {e}')
+
+    async def close(self):
+        """写完剩余结果并 fsync"""
+        self.closing = True
+        self.append({'event': 'end', 'finished_at': round(time.time(), 3)})
+        if self.flusher:
+            self.flusher.cancel()
+            self.flusher = None
+        if not self.path:
+            return
+        if self.flushes:
+            await asyncio.gather(*self.flushes, return_exceptions=True)
+        await self.flush()
+        if self.file:
+            try:
+                await asyncio.to_thread(os.fsync, self.file.fileno())
+                await self.file.close()
+            except Exception as e:
+                print(f'关闭结果文件失败: {e}')
+            self.file = None
+        print(f'登录结果已写入 {self.path}')
+
+    @staticmethod
+    def read(path: str) -> List[Dict]:
+        """读取结果文件（中断时写了一半的最后一行会被忽略）"""
+        records = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
 
+    @staticmethod
+    def summarize(records: List[Dict], provider: str) -> Tuple[List[str], List[Tuple[str, str]], int, List[str]]:
+        """
+        从结果流汇总某个提供商
 
-async def delay_time(ms):
-    """延时函数，单位毫秒"""
-    await asyncio.sleep(ms / 1000)
+        Returns:
+            Tuple: (成功账号, [(失败账号, 失败类型)], 跳过数, 错误信息)
+        """
+        success_accounts = []
+        failed_accounts = []
+        skipped = 0
+        errors = []
+        for record in records:
+            if record.get('provider') != provider:
+                continue
+            if record['event'] == 'error':
+                errors.append(record['error'])
+                continue
+            label = f"{record['account']} (panel{record['panel']})" if record.get('panel') else record['account']
+            if record['outcome'] == 'success':
+                success_accounts.append(label)
+            elif record['outcome'] == 'skipped':
+                skipped += 1
+            else:
+                failed_accounts.append((label, record.get('failure') or FAILURE_TRANSIENT))
+        return success_accounts, failed_accounts, skipped, errors
+
+
+def format_accounts(success_accounts: List[str], failed_accounts: List[Tuple[str, str]]) -> str:
+    """汇总通知中的账号列表：失败账号按失败原因分组"""
+    message = ''
+    if success_accounts:
+        message += f'\n<b>成功账号:</b>\n'
+        for acc in success_accounts:
+            message += f'  • {acc}\n'
+
+    groups = {}
+    for acc, failure in failed_accounts:
+        groups.setdefault(failure, []).append(acc)
+    for failure, accounts in groups.items():
+        message += f'\n<b>失败账号 - {FAILURE_LABELS.get(failure, failure)} ({len(accounts)}):</b>\n'
+        for acc in accounts:
+            message += f'  • {acc}\n'
+    return message
+
+
+class RunProgress:
+    """
+    运行进度：订阅结果流，统计各提供商已完成的账号数，渲染成一条原地更新的 Telegram 进度消息
+    """
+
+    def __init__(self, telegram: Telegram, results: ResultSink):
+        self.tg = telegram
+        self.enabled = telegram.enabled and TELEGRAM_PROGRESS
+        self.started = time.monotonic()
+        self.providers = {}  # 提供商 -> [名称, 账号总数, 成功, 失败, 跳过]
+        self.finished = False
+        results.subscribe(self.update)
+
+    def add(self, provider: str, label: str, total: int, failed: int = 0, skipped: int = 0):
+        """登记一个提供商的账号总数（以及登记前已经确定失败、跳过的账号数）"""
+        self.providers[provider] = [label, total, 0, failed, skipped]
+        self.refresh()
+
+    def update(self, record: Dict):
+        """结果流回调"""
+        counts = self.providers.get(record.get('provider'))
+        if counts is None or record['event'] != 'account':
+            return
+        counts[{'success': 2, 'skipped': 4}.get(record['outcome'], 3)] += 1
+        self.refresh()
+
+    def finish(self):
+        """标记运行结束"""
+        self.finished = True
+        self.refresh()
+
+    def refresh(self):
+        if self.enabled and self.providers:
+            self.tg.progress(self.render())
+
+    def render(self) -> str:
+        """渲染进度消息"""
+        title = '✅ 保活任务已完成' if self.finished else '⏳ 保活任务进行中'
+        message = f'<b>{title}</b>\n\n'
+        for label, total, success, failed, skipped in self.providers.values():
+            message += f'<b>{label}:</b> {success + failed + skipped}/{total}  ✅ {success}  ❌ {failed}'
+            message += f'  ⏭ {skipped}\n' if skipped else '\n'
+        # 用时只精确到分钟，账号没有进展时不会触发编辑
+        message += f'\n<b>已用时间:</b> {int(time.monotonic() - self.started) // 60} 分钟'
+        return message
 
 
 # ==================== Serv00 登录 ====================
 class Serv00Login:
     """Serv00/CT8 登录处理"""
 
-    def __init__(self, telegram: Telegram):
+    send_summary = True  # 分片运行时关闭，由 merge 汇总后统一发送
+
+    detector = LoginDetector(
+        success=('dashboard', 'account', 'welcome', 'strona główna', 'logged', 'profile'),
+        error=('error', 'błąd', 'invalid', 'failed', 'unauthorized', 'forbidden'),
+        logout_selector='a[href="/logout/"]',
+        logout_re=SERV00_LOGOUT_RE.pattern
+    )
+
+    def __init__(self, telegram: Telegram, sessions: Optional[SessionCache] = None,
+                 metrics: Optional[RunMetrics] = None, driver: Optional[BrowserDriver] = None,
+                 state: Optional[AccountState] = None, results: Optional[ResultSink] = None):
         self.tg = telegram
-        self.browser = None
+        self.sessions = sessions or SessionCache()
+        self.metrics = metrics or RunMetrics()
+        self.state = state or AccountState(enabled=False)
+        self.results = results or ResultSink(None)
+        self.failures = {}  # 账号 -> 最近一次失败的类型
+        self.overloads = {}  # 账号 -> 最近一次登录中看到的过载信号（429/5xx、超时、过载页面）
+        # 未传入共享驱动时自己创建，并在 run() 结束时关闭
+        self.owns_driver = driver is None
+        self.driver = driver or BrowserDriver(self.metrics)
+        self.http_connector = None
+        self.waits = WaitEngine('Serv00')
+        self.retries = RetryPolicy(self.metrics, 'serv00')
+        self.resources = ResourceFilter('serv00', self.metrics, RESOURCE_ALLOWLIST['serv00'])
         self.message = ''
 
     async def login_account(self, username: str, password: str, panelnum: str) -> bool:
         """
-        登录单个 Serv00 账号
+        登录单个 Serv00 账号：先走 HTTP 快速登录，无法判断结果时再用浏览器登录
 
         Args:
             username: 用户名
@@ -112,123 +1958,291 @@ class Serv00Login:
             panelnum: 面板编号
 
         Returns:
-            bool: 登录是否成功
+            bool: 登录是否成功（失败类型记录在 self.failures 中）
         """
-        page = None
+        timer = self.metrics.timer('serv00', f'{username}@panel{panelnum}')
+        result = None
         try:
-            # 如果浏览器未启动，则启动浏览器
-            if not self.browser:
-                self.browser = await launch(
-                    headless=True,
-                    args=['--no-sandbox', '--disable-setuid-sandbox']
-                )
+            result = await self.http_login(username, password, panelnum, timer)
+            if result is False:
+                self.failures[f'{username}@panel{panelnum}'] = FAILURE_CREDENTIAL
+            if result is None:
+                if SERV00_HTTP_LOGIN:
+                    print(f'账号 {username} 改用浏览器登录')
+                result = await self.browser_login(username, password, panelnum, timer)
+            return result
+        finally:
+            timer.finish(bool(result))
 
-            page = await self.browser.newPage()
-            url = f'https://panel{panelnum}.serv00.com/login/?next=/'
-            await page.goto(url)
-
-            # 等待登录表单加载
-            await page.waitForSelector('#id_username', {'visible': True, 'timeout': 10000})
-            await page.waitForSelector('#id_password', {'visible': True, 'timeout': 10000})
-
-            # 清空并输入账号和密码（使用 evaluate 直接设置 value，更可靠）
-            await page.evaluate(f'''() => {{
-                document.querySelector('#id_username').value = '{username}';
-                document.querySelector('#id_password').value = '{password}';
-            }}''')
-
-            # 等待表单加载完成
-            await asyncio.sleep(1)
-
-            # 尝试新的登录按钮选择器（优先使用 data-login-form 属性）
-            login_button = None
-            selectors = [
-                'form[data-login-form] button[type="submit"]',  # 新网页结构
-                'button[type="submit"]',
-                'button.button--primary',
-                'input[type="submit"]',
-                '#submit'
-            ]
-
-            for selector in selectors:
-                try:
-                    login_button = await page.querySelector(selector)
-                    if login_button:
-                        # 等待按钮可见
-                        await page.waitForSelector(selector, {'visible': True, 'timeout': 5000})
-                        print(f'找到登录按钮: {selector}')
-                        break
-                except:
-                    continue
+    async def get_http_connector(self):
+        """获取共享的 HTTP 连接池（未安装 aiohttp 时返回 None，只使用浏览器登录）"""
+        if not SERV00_HTTP_LOGIN:
+            return None
+        if self.http_connector is None:
+            try:
+                import aiohttp
+            except ImportError:
+                print('⚠️ 未安装 aiohttp，Serv00 仅使用浏览器登录')
+                self.http_connector = False
+                return None
+            self.http_connector = aiohttp.TCPConnector(
+                limit=max(1, SERV00_CONCURRENCY) * 2,
+                limit_per_host=max(1, SERV00_PANEL_CONCURRENCY) * 2,
+                ttl_dns_cache=300
+            )
+        return self.http_connector or None
 
-            if not login_button:
-                raise Exception('无法找到登录按钮')
+    async def http_login(self, username: str, password: str, panelnum: str,
+                         timer: Optional[StepTimer] = None) -> Optional[bool]:
+        """
+        不启动浏览器，直接用 HTTP 提交 Django 登录表单
 
-            # 使用 Promise.all 并发执行点击和等待跳转（更稳定）
-            await asyncio.gather(
-                page.waitForNavigation({'waitUntil': 'domcontentloaded'}),
-                page.evaluate('(button) => button.click()', login_button)
-            )
+        每个账号使用独立的 cookie，但共享同一个连接池
 
-            # 等待页面加载完成
-            await asyncio.sleep(2)
-
-            # 判断是否登录成功（多重判断）
-            current_url = page.url or ''
-            page_title = await page.title() or ''
-
-            # 检查登出按钮是否存在
-            logout_button = await page.querySelector('a[href="/logout/"]')
-
-            # 检查页面内容中的成功指标
-            page_content = await page.content() or ''
-            success_indicators = ['dashboard', 'panel', 'account', 'welcome', 'strona główna', 'logged', 'profile']
-            error_indicators = ['error', 'błąd', 'invalid', 'failed', 'unauthorized', 'forbidden']
-
-            # 判断登录是否成功（优先级从高到低）
-            is_logged_in = False
-
-            # 方法1: 检查登出按钮（最可靠的判断方式）
-            if logout_button:
-                is_logged_in = True
-                print(f'✅ 检测到登出按钮，登录成功')
-                return is_logged_in  # 直接返回，不再检查错误信息
-
-            # 方法2: 检查 URL 中的成功指标
-            if any(indicator in current_url.lower() for indicator in success_indicators):
-                is_logged_in = True
-                print(f'✅ URL 包含成功指标，登录成功: {current_url}')
-                return is_logged_in
-
-            # 方法3: 检查页面标题
-            if any(indicator in page_title.lower() for indicator in success_indicators):
-                is_logged_in = True
-                print(f'✅ 页面标题包含成功指标，登录成功: {page_title}')
-                return is_logged_in
-
-            # 方法4: 检查页面内容
-            if any(indicator in page_content.lower() for indicator in success_indicators):
-                is_logged_in = True
-                print(f'✅ 页面内容包含成功指标，登录成功')
-                return is_logged_in
-
-            # 方法5: 检查是否有错误信息（只有在没有成功指标时才检查）
-            if any(indicator in page_content.lower() for indicator in error_indicators):
-                is_logged_in = False
-                print(f'❌ 页面包含错误信息，登录失败')
-                return is_logged_in
-
-            # 如果没有明确的成功或失败指标，返回 False
-            print(f'⚠️ 无法确定登录状态，URL: {current_url}')
-            return False
+        Args:
+            username: 用户名
+            password: 密码
+            panelnum: 面板编号
+            timer: 分段计时器（可选）
+
+        Returns:
+            Optional[bool]: 登录成功 True，账号密码被拒绝 False，无法判断时 None（交给浏览器登录）
+        """
+        connector = await self.get_http_connector()
+        if not connector:
+            return None
+
+        import aiohttp
+
+        timer = timer or self.metrics.timer('serv00', f'{username}@panel{panelnum}')
+        base_url = SERV00_PANEL_URL.format(panelnum=panelnum)
+        login_url = f'{base_url}/login/?next=/'
+        session_key = f'{username}@panel{panelnum}'
+        headers = {'User-Agent': BROWSER_USER_AGENT}
+        timeout = aiohttp.ClientTimeout(total=30)
+
+        try:
+            # unsafe=True 允许 IP 地址形式的面板地址（例如本地测试服务器）保存 cookie
+            async with aiohttp.ClientSession(connector=connector, connector_owner=False,
+                                             cookie_jar=aiohttp.CookieJar(unsafe=True),
+                                             headers=headers, timeout=timeout) as session:
+                # 优先尝试缓存的会话
+                cookies = self.sessions.load('serv00', session_key)
+                if cookies:
+                    timer.step('http_session_check')
+                    session.cookie_jar.update_cookies({c['name']: c['value'] for c in cookies})
+                    async with session.get(f'{base_url}/') as response:
+                        html = await response.text()
+                    if SERV00_LOGOUT_RE.search(html):
+                        print(f'✅ 账号 {username} 缓存会话有效（HTTP），跳过登录表单')
+                        self.sessions.save('serv00', session_key, self.jar_cookies(session, base_url))
+                        return True
+                    print(f'⚠️ 账号 {username} 缓存会话已失效，重新登录')
+                    self.sessions.invalidate('serv00', session_key)
+                    session.cookie_jar.clear()
+
+                # 获取登录页与 CSRF token
+                timer.step('http_goto')
+                async with session.get(login_url) as response:
+                    if response.status != 200:
+                        print(f'HTTP 登录页返回 {response.status}')
+                        self.check_overload(session_key, response.status)
+                        return None
+                    html = await response.text()
+
+                token = SERV00_CSRF_RE.search(html)
+                if not token:
+                    print('HTTP 登录页中未找到 CSRF token')
+                    return None
+
+                form = {
+                    'csrfmiddlewaretoken': token.group(1),
+                    self.form_field_name(html, 'id_username', 'username'): username,
+                    self.form_field_name(html, 'id_password', 'password'): password,
+                }
+
+                # Django 在 HTTPS 下会校验 Referer
+                timer.step('http_submit')
+                async with session.post(login_url, data=form, headers={'Referer': login_url}) as response:
+                    status = response.status
+                    html = await response.text()
+
+                if SERV00_LOGOUT_RE.search(html):
+                    print(f'✅ 检测到登出按钮（HTTP），登录成功')
+                    self.sessions.save('serv00', session_key, self.jar_cookies(session, base_url))
+                    return True
 
+                if status == 200 and 'id_password' in html and SERV00_FORM_ERROR_RE.search(html):
+                    print(f'❌ 登录表单返回错误信息（HTTP），登录失败')
+                    return False
+
+                print(f'⚠️ HTTP 登录无法确定结果（状态码 {status}）')
+                self.check_overload(session_key, status, html)
+                return None
+
+        except Exception as e:
+            print(f'账号 {username} HTTP 登录出错: {e}')
+            if is_timeout_error(e):
+                self.overloads[session_key] = 'timeout'
+            return None
+
+    def check_overload(self, session_key: str, status: Optional[int], html: str = ''):
+        """响应为 429/5xx 或过载错误页时记下过载信号，供并发控制使用"""
+        if status is not None and (status == 429 or status >= 500):
+            self.overloads[session_key] = f'HTTP {status}'
+        elif html and SERV00_OVERLOAD_RE.search(html):
+            self.overloads[session_key] = 'overload page'
+
+    @staticmethod
+    def form_field_name(html: str, field_id: str, default: str) -> str:
+        """根据 input 的 id 找到表单字段名"""
+        for tag in re.findall(r'<input[^>]*>', html, re.IGNORECASE):
+            if f'id="{field_id}"' in tag:
+                name = re.search(r'name="([^"]+)"', tag)
+                if name:
+                    return name.group(1)
+        return default
+
+    @staticmethod
+    def jar_cookies(session, base_url: str) -> List[Dict]:
+        """把 aiohttp 的 cookie 转成与 Playwright context.cookies() 相同的格式，便于两种登录方式共用缓存"""
+        from yarl import URL
+
+        domain = URL(base_url).host
+        return [
+            {'name': name, 'value': morsel.value, 'domain': morsel['domain'] or domain, 'path': morsel['path'] or '/'}
+            for name, morsel in session.cookie_jar.filter_cookies(URL(base_url)).items()
+        ]
+
+    async def close(self):
+        """关闭浏览器（仅限自己创建的驱动，共享驱动只归还空闲页面）与 HTTP 连接池"""
+        if self.owns_driver:
+            await self.driver.close()
+        else:
+            await self.driver.release_idle(self.resources)
+        if self.http_connector:
+            await self.http_connector.close()
+        self.http_connector = None
+
+    async def browser_login(self, username: str, password: str, panelnum: str,
+                            timer: Optional[StepTimer] = None) -> bool:
+        """
+        使用浏览器登录单个 Serv00 账号
+
+        Args:
+            username: 用户名
+            password: 密码
+            panelnum: 面板编号
+            timer: 分段计时器（可选）
+
+        Returns:
+            bool: 登录是否成功
+        """
+        timer = timer or self.metrics.timer('serv00', f'{username}@panel{panelnum}')
+        base_url = SERV00_PANEL_URL.format(panelnum=panelnum)
+        session_key = f'{username}@panel{panelnum}'
+        try:
+            # 从页面池取出干净的页面（上一个账号的 cookie 与存储已清空）；有缓存会话时预先写入 cookie
+            timer.step('new_context')
+            cookies = self.sessions.load('serv00', session_key)
+            async with self.driver.lease(self.resources, cookies=cookies) as page:
+                return await self.submit_login(page, username, password, base_url, session_key, cookies, timer)
         except Exception as e:
             print(f'账号 {username} 登录时出现错误: {e}')
+            if is_timeout_error(e):
+                self.overloads[session_key] = 'timeout'
             return False
 
-        finally:
-            if page:
-                await page.close()
+    async def submit_login(self, page, username: str, password: str, base_url: str, session_key: str,
+                           cookies: Optional[List[Dict]], timer: StepTimer) -> bool:
+        """在浏览器页面中检查缓存会话并提交登录表单"""
+        context = page.context
+        # 优先尝试缓存的会话
+        if cookies:
+            timer.step('session_check')
+            await page.goto(f'{base_url}/')
+            if await page.query_selector('a[href="/logout/"]'):
+                print(f'✅ 账号 {username} 缓存会话有效，跳过登录表单')
+                self.sessions.save('serv00', session_key, await context.cookies())
+                return True
+            print(f'⚠️ 账号 {username} 缓存会话已失效，重新登录')
+            self.sessions.invalidate('serv00', session_key)
+
+        timer.step('goto')
+        url = f'{base_url}/login/?next=/'
+        response = await page.goto(url)
+        if response:
+            self.check_overload(session_key, response.status)
+
+        # 等待登录表单加载
+        await page.wait_for_selector('#id_username', state='visible', timeout=10000)
+        await page.wait_for_selector('#id_password', state='visible', timeout=10000)
+
+        # 清空并输入账号和密码
+        timer.step('form_fill')
+        await page.fill('#id_username', username)
+        await page.fill('#id_password', password)
+
+        # 尝试新的登录按钮选择器（优先使用 data-login-form 属性）
+        login_button = None
+        selectors = [
+            'form[data-login-form] button[type="submit"]',  # 新网页结构
+            'button[type="submit"]',
+            'button.button--primary',
+            'input[type="submit"]',
+            '#submit'
+        ]
+
+        for selector in selectors:
+            try:
+                login_button = await page.query_selector(selector)
+                if login_button:
+                    # 等待按钮可见
+                    await page.wait_for_selector(selector, state='visible', timeout=5000)
+                    print(f'找到登录按钮: {selector}')
+                    break
+            except:
+                continue
+
+        if not login_button:
+            raise Exception('无法找到登录按钮')
+
+        # 点击的同时等待跳转（更稳定）
+        timer.step('submit')
+        async with page.expect_navigation(wait_until='domcontentloaded'):
+            await login_button.click()
+
+        # 等待登出按钮或错误提示出现
+        await self.waits.until(
+            f'{username} 登录结果',
+            page.wait_for_selector('a[href="/logout/"], .errorlist, .alert--error', timeout=0),
+            timeout=5, legacy=3
+        )
+
+        timer.step('detect')
+        is_logged_in, failure = await self.detect_login(page)
+        if failure:
+            self.failures[session_key] = failure
+        if is_logged_in:
+            self.sessions.save('serv00', session_key, await context.cookies())
+        return is_logged_in
+
+    async def detect_login(self, page) -> Tuple[bool, Optional[str]]:
+        """
+        判断提交表单后是否登录成功
+
+        Args:
+            page: 提交登录表单后的页面
+
+        Returns:
+            Tuple[bool, Optional[str]]: (登录是否成功, 失败类型)，页面出现错误信息时视为账号密码被拒绝
+        """
+        verdict = await self.detector.inspect(page)
+        is_logged_in, reason = self.detector.judge(verdict)
+        print(reason)
+        if is_logged_in:
+            return True, None
+        return False, FAILURE_CREDENTIAL if verdict['error_match'] else FAILURE_TRANSIENT
 
     async def run(self, accounts: List[Dict]):
         """
@@ -245,484 +2259,798 @@ class Serv00Login:
         print('开始 Serv00/CT8 账号登录')
         print('='*50 + '\n')
 
-        success_accounts = []
-        failed_accounts = []
+        limiter = HostLimiter(SERV00_CONCURRENCY, SERV00_PANEL_CONCURRENCY, SERV00_PANEL_DELAY, self.metrics, 'serv00')
+        if not SERV00_HTTP_LOGIN:
+            # 只用浏览器登录时，在第一个账号排队期间预热页面池
+            asyncio.get_running_loop().create_task(self.driver.prewarm(self.resources))
 
-        for account in accounts:
+        async def login_one(account: Dict) -> bool:
             username = account['username']
             password = account['password']
             panelnum = account['panelnum']
-
-            print(f'正在登录账号: {username} (panel{panelnum})')
-            is_logged_in = await self.login_account(username, password, panelnum)
+            key = f'{username}@panel{panelnum}'
+
+            spent = 0.0
+
+            async def attempt(last: bool) -> Tuple[bool, str]:
+                nonlocal spent
+                async with limiter.slot(f'panel{panelnum}.serv00.com') as slot:
+                    print(f'正在登录账号: {username} (panel{panelnum})')
+                    started = time.monotonic()
+                    ok = await self.login_account(username, password, panelnum)
+                    spent += time.monotonic() - started
+                    failure = None if ok else self.failures.pop(key, FAILURE_TRANSIENT)
+                    # 429/5xx、超时与过载页面让该面板的并发减半
+                    slot.overload = self.overloads.pop(key, None) or (failure if failure == FAILURE_TRANSIENT else None)
+                return ok, failure
+
+            # 临时性失败退避后重试，等待期间让出名额
+            is_logged_in, failure, attempts = await self.retries.run(f'{username} (panel{panelnum})', attempt)
+            if attempts:
+                # 每个账号只记录一次最终结果，耗时为各次尝试之和
+                self.state.record('serv00', key, is_logged_in, spent)
+            self.results.write('serv00', username, 'success' if is_logged_in else 'failure', failure, spent,
+                               panel=panelnum, attempts=attempts)
 
             if is_logged_in:
-                success_accounts.append(f'{username} (panel{panelnum})')
                 print(f'✅ 账号 {username} 登录成功')
             else:
-                failed_accounts.append(f'{username} (panel{panelnum})')
                 print(f'❌ 账号 {username} 登录失败')
+            return is_logged_in
 
-            # 随机延时 1-8 秒
-            delay = random.randint(1000, 8000)
-            print(f'等待 {delay/1000:.1f} 秒后继续...\n')
-            await delay_time(delay)
-
-        # 关闭浏览器
-        if self.browser:
-            await self.browser.close()
-            self.browser = None
+        # 并发登录，每个账号完成时写入结果流
+        try:
+            await asyncio.gather(*(login_one(account) for account in accounts))
+        finally:
+            # 关闭浏览器与连接池
+            await self.close()
 
         print('='*50)
         print('Serv00 登录完成!')
+        print(self.waits.summary())
+        self.resources.report()
         print('='*50 + '\n')
+        self.metrics.set('wait_seconds', round(self.waits.waited, 3), provider='serv00')
+        self.metrics.set('wait_legacy_seconds', self.waits.legacy, provider='serv00')
 
-        # 构建简洁的通知消息
+        # 从结果流生成通知（分片运行时由 merge 统一发送）
+        if self.send_summary:
+            success_accounts, failed_accounts, skipped, _ = ResultSink.summarize(self.results.records, 'serv00')
+            self.tg.send(self.build_summary(success_accounts, failed_accounts, skipped))
+
+    @staticmethod
+    def build_summary(success_accounts: List[str], failed_accounts: List[Tuple[str, str]], skipped: int = 0) -> str:
+        """构建简洁的汇总通知消息"""
         now_time = format_to_iso(datetime.utcnow() + timedelta(hours=8))
         message = f'🔐 <b>Serv00/CT8 自动登录</b>\n\n'
         message += f'<b>时间:</b> {now_time}\n'
-        message += f'<b>总计:</b> {len(accounts)} 个账号\n'
+        message += f'<b>总计:</b> {len(success_accounts) + len(failed_accounts)} 个账号\n'
         message += f'<b>成功:</b> {len(success_accounts)} ✅\n'
         message += f'<b>失败:</b> {len(failed_accounts)} ❌\n'
-
-        if success_accounts:
-            message += f'\n<b>成功账号:</b>\n'
-            for acc in success_accounts:
-                message += f'  • {acc}\n'
-
-        if failed_accounts:
-            message += f'\n<b>失败账号:</b>\n'
-            for acc in failed_accounts:
-                message += f'  • {acc}\n'
-
-        # 发送通知
-        self.tg.send(message)
+        if skipped:
+            message += f'<b>跳过:</b> {skipped} 个（{STATE_FRESH_HOURS:g} 小时内已登录成功）\n'
+        message += format_accounts(success_accounts, failed_accounts)
+        return message
 
 
 # ==================== ClawCloud 登录 ====================
-class ClawCloudLogin:
-    """ClawCloud 登录处理（使用 Playwright 同步 API）"""
-
-    def __init__(self, telegram: Telegram):
-        self.tg = telegram
+class AccountTrace:
+    """单个账号的登录日志、截图与分段计时（并发登录时每个账号各自一份，互不干扰）"""
+
+    icons = {
+        "INFO": "ℹ️",
+        "SUCCESS": "✅",
+        "ERROR": "❌",
+        "WARN": "⚠️",
+        "STEP": "🔹"
+    }
+
+    def __init__(self, username: str, timer: StepTimer):
+        self.username = username
+        self.timer = timer
         self.logs = []
-        self.screenshots = []
+        self.screenshots = []  # [(名称, 图片字节, 上传文件名)]
         self.screenshot_count = 0
-        self.browser = None
-        self.context = None
+        self.failure = FAILURE_TRANSIENT  # 失败类型，未明确判断时按临时性失败处理
+        self.last_attempt = True
+        self.slot = HostSlot()  # 登录名额，开始等待人工验证时归还
 
     def log(self, msg: str, level: str = "INFO"):
         """记录日志"""
-        icons = {
-            "INFO": "ℹ️",
-            "SUCCESS": "✅",
-            "ERROR": "❌",
-            "WARN": "⚠️",
-            "STEP": "🔹"
-        }
-        line = f"{icons.get(level, '•')} {msg}"
-        print(line)
+        line = f"{self.icons.get(level, '•')} {msg}"
+        print(f"[{self.username}] {line}")
         self.logs.append(line)
 
-    def screenshot(self, page, name: str) -> str:
-        """截图"""
+    async def screenshot(self, page, name: str, alert: bool = False) -> Optional[Tuple[bytes, str]]:
+        """
+        按 SCREENSHOT_MODE 截图并保存在内存中
+
+        Args:
+            page: 当前页面
+            name: 截图名称
+            alert: 失败或需要人工处理时的截图（除 none 外的所有模式都会截取）
+
+        Returns:
+            Optional[Tuple[bytes, str]]: 图片字节与上传文件名，未截图时返回 None
+        """
+        if SCREENSHOT_MODE == 'none' or (SCREENSHOT_MODE == 'failure' and not alert):
+            return None
+
         self.screenshot_count += 1
-        filename = f"{self.screenshot_count:02d}_{name}.png"
         try:
-            page.screenshot(path=filename)
-            self.screenshots.append(filename)
-        except:
-            pass
-        return filename
+            data, fmt = await capture_screenshot(page)
+        except Exception:
+            return None
+        filename = screenshot_filename(fmt)
+
+        if SCREENSHOT_MODE != 'all':
+            # 其余模式只需要最近一张
+            self.screenshots.clear()
+        self.screenshots.append((f"{self.screenshot_count:02d}_{name}", data, filename))
+        return data, filename
+
+
+def screenshot_filename(fmt: str) -> str:
+    """按实际图片格式生成上传文件名"""
+    return f"screenshot.{'jpg' if fmt == 'jpeg' else fmt}"
+
+
+async def capture_screenshot(page) -> Tuple[bytes, str]:
+    """
+    截取当前视口并按配置压缩
+
+    超过 SCREENSHOT_MAX_BYTES 时逐步降低质量重新截取。
+    返回图片字节与实际格式（PNG 超限改用 JPEG、未安装 Pillow 无法转 WebP 时与 SCREENSHOT_FORMAT 不同）
+    """
+    fmt = 'png' if SCREENSHOT_FORMAT == 'png' else 'jpeg'
+    quality = SCREENSHOT_QUALITY
+    while True:
+        if fmt == 'png':
+            data = await page.screenshot(type='png')
+        else:
+            data = await page.screenshot(type='jpeg', quality=quality)
+        actual = fmt
+        if fmt == 'jpeg' and SCREENSHOT_FORMAT == 'webp':
+            data, actual = encode_webp(data, quality)
+
+        if len(data) <= SCREENSHOT_MAX_BYTES or (fmt == 'jpeg' and quality <= 20):
+            return data, actual
+        # PNG 无法调节质量，超限时改用 JPEG
+        if fmt == 'png':
+            fmt = 'jpeg'
+        else:
+            quality = max(20, quality // 2)
+
+
+def encode_webp(data: bytes, quality: int) -> Tuple[bytes, str]:
+    """JPEG 转 WebP（需要 Pillow，未安装时原样返回 JPEG），返回图片字节与格式"""
+    try:
+        from io import BytesIO
+        from PIL import Image
+    except ImportError:
+        return data, 'jpeg'
+
+    buffer = BytesIO()
+    Image.open(BytesIO(data)).save(buffer, format='WEBP', quality=quality)
+    return buffer.getvalue(), 'webp'
+
+
+class TotpScheduler:
+    """
+    按时间窗口安排 TOTP 验证码
+
+    验证码剩余有效期不足 TOTP_MIN_VALIDITY 秒时只等到下一个窗口开始，而不是提交后被拒再等 30 秒并刷新页面；
+    同一窗口的验证码被拒（或已用过）时同样只等剩余时间。多个账号同时到达两步验证时会在同一个窗口边界一起醒来，
+    在窗口开头批量提交。时间以 GitHub 服务器时间为准（TOTP_CLOCK_SKEW 或响应头 Date 估算的时钟偏差）
+    """
+
+    def __init__(self, metrics: RunMetrics, interval: int = 30):
+        self.metrics = metrics
+        self.interval = interval
+        self.skew = float(TOTP_CLOCK_SKEW) if TOTP_CLOCK_SKEW else None
+        self.skew_lock = asyncio.Lock()
+        self.used = {}  # 密钥 -> 最近一次提交的窗口序号
+
+    async def measure_skew(self, page) -> float:
+        """用当前页面服务器响应头的 Date 估算时钟偏差（整次运行只测一次，失败时视为 0）"""
+        async with self.skew_lock:
+            if self.skew is None:
+                self.skew = 0.0
+                try:
+                    from email.utils import parsedate_to_datetime
+
+                    sent = time.time()
+                    response = await page.context.request.head(page.url, timeout=5000)
+                    received = time.time()
+                    server = parsedate_to_datetime(response.headers['date']).timestamp()
+                    # Date 只精确到秒，偏差小于 2 秒时视为误差
+                    estimate = server + 0.5 - (sent + received) / 2
+                    if abs(estimate) >= 2:
+                        self.skew = round(estimate, 1)
+                except Exception:
+                    pass
+                self.metrics.set('totp_clock_skew_seconds', self.skew)
+        return self.skew
+
+    def now(self) -> float:
+        """服务器时间"""
+        return time.time() + (self.skew or 0.0)
+
+    def remaining(self, now: float = None) -> float:
+        """当前验证码的剩余有效期（秒）"""
+        now = self.now() if now is None else now
+        return self.interval - now % self.interval
+
+    async def code(self, secret: str, log=None) -> str:
+        """
+        生成可以立即提交的验证码
+
+        剩余有效期不足或该窗口的验证码已经提交过时，等待到下一个窗口开始
+        """
+        import pyotp
+
+        totp = pyotp.TOTP(secret, interval=self.interval)
+        now = self.now()
+        counter = int(now // self.interval)
+        remaining = self.remaining(now)
+        if remaining < TOTP_MIN_VALIDITY or self.used.get(secret) == counter:
+            # 多留 0.2 秒，确保已进入下一个窗口
+            wait = remaining + 0.2
+            (log or print)(f"验证码剩余 {remaining:.1f} 秒，等待 {wait:.1f} 秒进入下一个时间窗口")
+            self.metrics.inc('totp_wait_seconds', round(wait, 2))
+            await asyncio.sleep(wait)
+            now = self.now()
+            counter = int(now // self.interval)
 
-    def notify(self, username: str, success: bool, error: str = ""):
-        """发送单个账号登录通知"""
+        self.used[secret] = counter
+        return totp.at(now)
+
+
+class ClawCloudLogin:
+    """ClawCloud 登录处理（使用 Playwright 异步 API，所有账号共享一个浏览器）"""
+
+    send_summary = True  # 分片运行时关闭，由 merge 汇总后统一发送
+
+    # 重定向回 ClawCloud 且不在登录页即视为完成
+    detector = LoginDetector(success_hosts=(CLAW_CLOUD_DOMAIN,), exclude=('signin',), scan_content=False)
+
+    def __init__(self, telegram: Telegram, sessions: Optional[SessionCache] = None,
+                 metrics: Optional[RunMetrics] = None, driver: Optional[BrowserDriver] = None,
+                 state: Optional[AccountState] = None, results: Optional[ResultSink] = None):
+        self.tg = telegram
+        self.sessions = sessions or SessionCache()
+        self.metrics = metrics or RunMetrics()
+        self.state = state or AccountState(enabled=False)
+        self.results = results or ResultSink(None)
+        self.failures = {}  # 账号 -> 最近一次失败的类型
+        # 未传入共享驱动时自己创建，并在 run() 结束时关闭
+        self.owns_driver = driver is None
+        self.driver = driver or BrowserDriver(self.metrics)
+        self.waits = WaitEngine('ClawCloud')
+        self.screenshot_refs = {}  # 账号 -> 最后一张截图的引用
+        self.retries = RetryPolicy(self.metrics, 'clawcloud')
+        self.totp = TotpScheduler(self.metrics)
+        self.resources = ResourceFilter('clawcloud', self.metrics, RESOURCE_ALLOWLIST['clawcloud'])
+
+    async def start(self):
+        """启动共享浏览器（整个批次只启动一次，与 Serv00 共用时可能已经启动）"""
+        await self.driver.get_browser()
+
+    async def close(self):
+        """关闭浏览器（仅限自己创建的驱动）"""
+        if self.owns_driver:
+            await self.driver.close()
+
+    def notify(self, trace: AccountTrace, success: bool, error: str = ""):
+        """发送单个账号登录通知（TELEGRAM_ACCOUNT_MESSAGES=1 时发送文本，截图按 SCREENSHOT_MODE 发送）"""
         if not self.tg.enabled:
             return
+        if not success and trace.failure == FAILURE_TRANSIENT and not trace.last_attempt:
+            # 稍后会重试，不发送失败通知
+            return
+        if TELEGRAM_ACCOUNT_MESSAGES:
+            self.send_account_message(trace, success, error)
 
+        # 发送截图（直接从内存上传；all 模式失败时发送全部步骤截图）
+        if trace.screenshots:
+            if not success:
+                shots = trace.screenshots if SCREENSHOT_MODE == 'all' else trace.screenshots[-1:]
+                for name, data, filename in shots:
+                    self.tg.send_photo(data, f"{trace.username} 登录失败截图 {name}", filename)
+            elif SCREENSHOT_MODE in ('last', 'all'):
+                _, data, filename = trace.screenshots[-1]
+                self.tg.send_photo(data, f"{trace.username} 登录成功", filename)
+
+    def send_account_message(self, trace: AccountTrace, success: bool, error: str = ""):
+        """发送单个账号的登录结果消息"""
         status_icon = "✅" if success else "❌"
         status_text = "成功" if success else "失败"
 
         msg = f'🌐 <b>ClawCloud 自动登录</b>\n\n'
         msg += f'<b>状态:</b> {status_icon} {status_text}\n'
-        msg += f'<b>账号:</b> {username}\n'
+        msg += f'<b>账号:</b> {trace.username}\n'
         msg += f'<b>时间:</b> {format_to_iso(datetime.utcnow() + timedelta(hours=8))}\n'
 
         if error:
             msg += f'\n<b>错误:</b> {error}'
 
-        if not success and self.logs:
-            msg += "\n\n<b>关键日志:</b>\n" + "\n".join(self.logs[-3:])
+        if not success and trace.logs:
+            msg += "\n\n<b>关键日志:</b>\n" + "\n".join(trace.logs[-3:])
 
         self.tg.send(msg)
 
-        # 发送截图
-        if self.screenshots:
-            if not success:
-                # 失败时发送最后一张截图
-                self.tg.send_photo(self.screenshots[-1], "登录失败截图")
-            else:
-                self.tg.send_photo(self.screenshots[-1], "登录成功")
+    async def wait_verification(self, page, markers: Tuple[str, ...], total: int, trace: AccountTrace,
+                                prompt_id: Optional[int] = None) -> bool:
+        """
+        等待人工完成验证：URL 一离开验证页就立即返回
 
-    async def login_account(self, username: str, password: str, mfasecret: str = None) -> bool:
+        用户在 Telegram 中回复验证码时立即填入页面提交；验证在其他设备上完成时页面不一定会自动跳转，
+        因此没有收到回复时每隔 VERIFY_RELOAD_INTERVAL 秒刷新一次。
+        开始等待时归还登录名额，人工验证的时间不占用登录并发（浏览器上下文仍然打开，继续计入内存预算）
+
+        Args:
+            page: 当前页面
+            markers: 验证页 URL 片段
+            total: 总等待时间（秒）
+            trace: 账号日志
+            prompt_id: 等待回复的 Telegram 提示消息 ID（可选）
+
+        Returns:
+            bool: 是否在限定时间内完成验证
+        """
+        await trace.slot.give_back()
+        reply = self.tg.listen(prompt_id) if prompt_id else None
+        try:
+            deadline = time.monotonic() + total
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                conditions = [url_matches(page, exclude=markers)]
+                if reply:
+                    # shield：URL 条件先满足时只取消等待，不取消回复本身
+                    conditions.append(asyncio.shield(reply))
+                if await self.waits.until(
+                    '人工验证', first_of(*conditions),
+                    timeout=min(VERIFY_RELOAD_INTERVAL, remaining), legacy=0, log=trace.log
+                ) and not (reply and reply.done()):
+                    return True
+
+                if reply and reply.done():
+                    await self.submit_code(page, reply.result(), trace)
+                    # 验证码错误时可以再次回复
+                    reply = self.tg.listen(prompt_id)
+                    continue
+                await page.reload(timeout=10000)
+        finally:
+            if reply:
+                reply.cancel()
+
+    async def submit_code(self, page, text: str, trace: AccountTrace):
+        """把 Telegram 回复中的验证码填入验证页并提交"""
+        code = re.sub(r'\s+', '', text)
+        trace.log(f"收到 Telegram 回复的验证码，正在提交", "INFO")
+        for selector in VERIFY_INPUT_SELECTORS:
+            try:
+                field = page.locator(selector).first
+                if await field.count() > 0:
+                    await field.fill(code, timeout=3000)
+                    # 部分验证页填满后会自动提交，此时按回车可能因页面跳转而失败
+                    await field.press('Enter', timeout=3000)
+                    return
+            except Exception:
+                return
+        trace.log("未找到验证码输入框", "WARN")
+
+    async def login_account(self, username: str, password: str, mfasecret: str = None,
+                            last_attempt: bool = True, slot: Optional[HostSlot] = None) -> bool:
         """
         登录单个 ClawCloud 账号
 
+        每个账号使用独立的浏览器上下文（cookie 互不共享），用完即关闭
+
         Args:
             username: GitHub 用户名
             password: GitHub 密码
             mfasecret: MFA 密钥（可选）
+            last_attempt: 是否为最后一次尝试（之后还会重试的临时性失败不发送失败通知）
+            slot: 本次登录占用的名额（可选，开始等待人工验证时归还）
 
         Returns:
-            bool: 登录是否成功
+            bool: 登录是否成功（失败类型记录在 self.failures 中）
         """
-        self.logs = []
-        self.screenshots = []
-        self.screenshot_count = 0
-
-        self.log(f'正在登录账号: {username}')
-
+        trace = AccountTrace(username, self.metrics.timer('clawcloud', username))
+        trace.last_attempt = last_attempt
+        if slot:
+            trace.slot = slot
+        is_logged_in = False
+        try:
+            is_logged_in = await self.login_flow(trace, password, mfasecret)
+            return is_logged_in
+        finally:
+            trace.timer.finish(is_logged_in)
+            if not is_logged_in:
+                self.failures[username] = trace.failure
+            if trace.screenshots:
+                name, data, _ = trace.screenshots[-1]
+                self.screenshot_refs[username] = {
+                    'name': name,
+                    'bytes': len(data),
+                    'sha256': hashlib.sha256(data).hexdigest()[:16],
+                }
+
+    async def login_flow(self, trace: AccountTrace, password: str, mfasecret: str = None) -> bool:
+        """登录流程主体（参数同 login_account）"""
+        username = trace.username
+        trace.log(f'正在登录账号: {username}')
+
+        context = None
         try:
-            from playwright.async_api import async_playwright
+            # 有缓存会话时直接带上 cookie 与 localStorage
+            trace.timer.step('new_context')
+            storage_state = self.sessions.load('clawcloud', username)
+            context = await self.driver.new_context(
+                self.resources,
+                viewport={'width': 1920, 'height': 1080},
+                storage_state=storage_state
+            )
+            page = await context.new_page()
 
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=['--no-sandbox', '--disable-setuid-sandbox']
-                )
-                context = await browser.new_context(
-                    viewport={'width': 1920, 'height': 1080},
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            try:
+                # 访问 ClawCloud
+                trace.log("步骤1: 打开 ClawCloud", "STEP")
+                trace.timer.step('goto')
+                await page.goto(SIGNIN_URL, timeout=60000)
+                # 登录按钮出现，或已登录被重定向离开 signin 页
+                await self.waits.until(
+                    '打开 ClawCloud',
+                    first_of(
+                        page.wait_for_selector(GITHUB_BUTTON_SELECTOR, timeout=0),
+                        url_matches(page, exclude=('signin',))
+                    ),
+                    timeout=30, legacy=2, log=trace.log
                 )
-                page = await context.new_page()
+                await trace.screenshot(page, "clawcloud")
 
-                try:
-                    # 访问 ClawCloud
-                    self.log("步骤1: 打开 ClawCloud", "STEP")
-                    await page.goto(SIGNIN_URL, timeout=60000)
-                    await page.wait_for_load_state('networkidle', timeout=30000)
-                    await asyncio.sleep(2)
-                    await page.screenshot(path=f"{self.screenshot_count:02d}_clawcloud.png")
-                    self.screenshots.append(f"{self.screenshot_count:02d}_clawcloud.png")
-                    self.screenshot_count += 1
-
-                    if 'signin' not in page.url.lower():
-                        self.log("已登录！", "SUCCESS")
-                        print('\n✅ ClawCloud 登录成功!\n')
-                        return True
+                if 'signin' not in page.url.lower():
+                    trace.log("已登录（使用缓存会话）！" if storage_state else "已登录！", "SUCCESS")
+                    self.sessions.save('clawcloud', username, await context.storage_state())
+                    print(f'\n✅ ClawCloud 账号 {username} 登录成功!\n')
+                    self.notify(trace, True)
+                    return True
+
+                if storage_state:
+                    # 缓存的 ClawCloud 会话被拒绝；GitHub 的 cookie 可能仍然有效，继续走 OAuth 流程
+                    trace.log("缓存会话已失效，重新登录", "WARN")
+                    self.sessions.invalidate('clawcloud', username)
 
-                    # 点击 GitHub 登录
-                    self.log("步骤2: 点击 GitHub 登录", "STEP")
+                # 点击 GitHub 登录
+                trace.log("步骤2: 点击 GitHub 登录", "STEP")
+                trace.timer.step('github_click')
+                try:
+                    await page.locator('button.chakra-button:has-text("GitHub")').first.click()
+                except:
                     try:
-                        await page.locator('button.chakra-button:has-text("GitHub")').first.click()
+                        await page.locator('button:has-text("GitHub")').first.click()
                     except:
                         try:
-                            await page.locator('button:has-text("GitHub")').first.click()
+                            await page.locator('a:has-text("GitHub")').first.click()
                         except:
-                            try:
-                                await page.locator('a:has-text("GitHub")').first.click()
-                            except:
-                                self.log("找不到 GitHub 登录按钮", "ERROR")
-                                self.notify(username, False, "找不到 GitHub 登录按钮")
-                                return False
+                            trace.log("找不到 GitHub 登录按钮", "ERROR")
+                            await trace.screenshot(page, "找不到GitHub按钮", alert=True)
+                            self.notify(trace, False, "找不到 GitHub 登录按钮")
+                            return False
 
-                    await asyncio.sleep(3)
-                    await page.wait_for_load_state('networkidle', timeout=30000)
-                    self.screenshot_count += 1
-                    await page.screenshot(path=f"{self.screenshot_count:02d}_点击GitHub后.png")
-                    self.screenshots.append(f"{self.screenshot_count:02d}_点击GitHub后.png")
+                await self.waits.until(
+                    '跳转 GitHub', url_matches(page, exclude=('signin',)),
+                    timeout=30, legacy=3, log=trace.log
+                )
+                await trace.screenshot(page, "点击GitHub后")
 
-                    # GitHub 登录
-                    if 'github.com' in page.url:
-                        self.log("步骤3: GitHub 账号登录", "STEP")
-                        self.screenshot_count += 1
-                        await page.screenshot(path=f"{self.screenshot_count:02d}_github_登录页.png")
-                        self.screenshots.append(f"{self.screenshot_count:02d}_github_登录页.png")
+                # GitHub 登录（GitHub 会话仍有效时会直接跳过此步骤）
+                if GITHUB_DOMAIN in page.url:
+                    trace.log("步骤3: GitHub 账号登录", "STEP")
+                    await trace.screenshot(page, "github_登录页")
 
-                        # 输入用户名和密码
-                        try:
-                            # 等待登录表单加载完成
-                            await page.wait_for_selector('input[name="login"]', timeout=10000)
-                            await page.wait_for_selector('input[name="password"]', timeout=10000)
-
-                            # 填充用户名
-                            username_input = page.locator('input[name="login"]').first
-                            await username_input.clear()
-                            await username_input.fill(username)
-                            self.log(f"已填充用户名: {username}", "INFO")
-
-                            # 等待一下确保用户名填充完成
-                            await asyncio.sleep(1)
-
-                            # 填充密码
-                            password_input = page.locator('input[name="password"]').first
-                            await password_input.clear()
-                            await password_input.fill(password)
-                            self.log(f"已填充密码（长度: {len(password)} 字符）", "INFO")
-
-                            # 截图确认填充状态
-                            self.screenshot_count += 1
-                            await page.screenshot(path=f"{self.screenshot_count:02d}_填充完成.png")
-                            self.screenshots.append(f"{self.screenshot_count:02d}_填充完成.png")
-
-                            # 等待一下确保密码填充完成
-                            await asyncio.sleep(1)
-
-                            # 点击登录按钮
-                            submit_btn = page.locator('input[type="submit"][value="Sign in"]').first
-                            await submit_btn.click()
-                            self.log("已点击登录按钮", "INFO")
-
-                            await asyncio.sleep(3)
-                            await page.wait_for_load_state('networkidle', timeout=30000)
-                            self.screenshot_count += 1
-                            await page.screenshot(path=f"{self.screenshot_count:02d}_github_登录后.png")
-                            self.screenshots.append(f"{self.screenshot_count:02d}_github_登录后.png")
-                        except Exception as e:
-                            self.log(f"GitHub 登录失败: {e}", "ERROR")
-                            # 截图当前状态
-                            self.screenshot_count += 1
-                            await page.screenshot(path=f"{self.screenshot_count:02d}_登录失败.png")
-                            self.screenshots.append(f"{self.screenshot_count:02d}_登录失败.png")
-                            self.notify(username, False, f"GitHub 登录失败: {e}")
-                            return False
+                    # 输入用户名和密码
+                    try:
+                        # 等待登录表单加载完成
+                        await page.wait_for_selector('input[name="login"]', timeout=10000)
+                        await page.wait_for_selector('input[name="password"]', timeout=10000)
+
+                        # 填充用户名
+                        trace.timer.step('form_fill')
+                        username_input = page.locator('input[name="login"]').first
+                        await username_input.clear()
+                        await username_input.fill(username)
+                        trace.log(f"已填充用户名: {username}", "INFO")
+
+                        # 填充密码
+                        password_input = page.locator('input[name="password"]').first
+                        await password_input.clear()
+                        await password_input.fill(password)
+                        trace.log(f"已填充密码（长度: {len(password)} 字符）", "INFO")
+
+                        # 截图确认填充状态
+                        await trace.screenshot(page, "填充完成")
+
+                        # 点击登录按钮
+                        trace.timer.step('submit')
+                        submit_btn = page.locator('input[type="submit"][value="Sign in"]').first
+                        await submit_btn.click()
+                        trace.log("已点击登录按钮", "INFO")
+
+                        # 离开登录页（两步验证/设备验证/授权/回到 ClawCloud），或出现错误提示
+                        await self.waits.until(
+                            'GitHub 登录提交',
+                            first_of(
+                                url_matches(page, include=GITHUB_AFTER_LOGIN_URLS),
+                                page.wait_for_selector('.flash-error', timeout=0)
+                            ),
+                            timeout=30, legacy=3, log=trace.log
+                        )
+                        await trace.screenshot(page, "github_登录后")
+                    except Exception as e:
+                        trace.log(f"GitHub 登录失败: {e}", "ERROR")
+                        # 截图当前状态
+                        await trace.screenshot(page, "登录失败", alert=True)
+                        self.notify(trace, False, f"GitHub 登录失败: {e}")
+                        return False
 
-                        # 处理两步验证（如果需要）
-                        if 'sessions/two-factor' in page.url or 'two_factor' in page.url:
-                            self.log(f"检测到两步验证", "WARN")
-                            self.screenshot_count += 1
-                            f_2fa = f"{self.screenshot_count:02d}_github_2fa.png"
-                            await page.screenshot(path=f_2fa)
-                            self.screenshots.append(f_2fa)
+                    # 仍停留在登录页并出现错误提示：用户名或密码被拒绝，不再等待重定向
+                    on_login_page = url_key(page.url) in (f'{GITHUB_DOMAIN}/login', f'{GITHUB_DOMAIN}/session')
+                    if on_login_page and await page.locator('.flash-error').count():
+                        trace.failure = FAILURE_CREDENTIAL
+                        trace.log("GitHub 用户名或密码错误", "ERROR")
+                        await trace.screenshot(page, "密码错误", alert=True)
+                        self.notify(trace, False, "GitHub 用户名或密码错误")
+                        return False
 
-                            # 尝试 MFA 自动填充
-                            if mfasecret:
-                                try:
-                                    import pyotp
-
-                                    self.log(f"检测到 MFA 密钥配置", "INFO")
-
-                                    # 清理密钥（移除空格和换行符）
-                                    processed_secret = mfasecret.strip().replace(' ', '').replace('\n', '')
-                                    self.log(f"密钥长度: {len(processed_secret)} 字符", "INFO")
-
-                                    # 尝试多次验证（最多3次）
-                                    max_attempts = 3
-                                    for attempt in range(1, max_attempts + 1):
-                                        try:
-                                            # 生成 MFA 验证码
-                                            totp = pyotp.TOTP(processed_secret)
-                                            current_time = time.time()
-                                            code = totp.now()
-
-                                            self.log(f"第 {attempt} 次尝试 - 生成验证码: {code} (时间戳: {int(current_time)})", "INFO")
-
-                                            # 清空输入框并填充验证码
-                                            input_selectors = [
-                                                'input[name="app_otp"]',
-                                                'input[name="otp"]',
-                                                'input[id="app_totp"]',
-                                                'input.js-verification-code-input-auto-submit'
-                                            ]
-
-                                            input_element = None
-                                            for selector in input_selectors:
-                                                try:
-                                                    input_element = page.locator(selector).first
-                                                    await input_element.clear(timeout=3000)
-                                                    await input_element.fill(code, timeout=3000)
-                                                    self.log(f"使用选择器 {selector} 填充成功", "INFO")
-                                                    break
-                                                except:
-                                                    continue
-
-                                            if not input_element:
-                                                raise Exception("无法找到 MFA 输入框")
-
-                                            # 提交验证码 - 尝试多种按钮选择器
-                                            # 注意：某些 GitHub 2FA 页面会在输入完成后自动提交，无需点击按钮
-                                            submit_selectors = [
-                                                'button:has-text("Verify")',  # GitHub 2FA 页面的 Verify 按钮
-                                                'button[type="submit"]',
-                                                'input[type="submit"]',
-                                                'button.btn-primary'
-                                            ]
-
-                                            submitted = False
-                                            for selector in submit_selectors:
-                                                try:
-                                                    submit_btn = page.locator(selector).first
-                                                    if await submit_btn.count() > 0:
-                                                        await submit_btn.click(timeout=5000)
-                                                        self.log(f"使用选择器 {selector} 点击提交按钮成功", "INFO")
-                                                        submitted = True
-                                                        break
-                                                except:
-                                                    continue
-
-                                            if not submitted:
-                                                # 如果没有找到提交按钮，可能是自动提交的表单
-                                                self.log("未找到提交按钮，可能是自动提交表单", "INFO")
-
-                                            self.log(f"等待验证结果...", "INFO")
-
-                                            # 等待页面响应
-                                            await asyncio.sleep(3)
-
-                                            # 检查是否验证成功
-                                            if 'two-factor' not in page.url and 'two_factor' not in page.url:
-                                                self.log("MFA 验证成功！", "SUCCESS")
+                    # 处理两步验证（如果需要）
+                    if 'sessions/two-factor' in page.url or 'two_factor' in page.url:
+                        trace.log(f"检测到两步验证", "WARN")
+                        trace.timer.step('two_factor')
+                        f_2fa = await trace.screenshot(page, "github_2fa", alert=True)
+
+                        # 尝试 MFA 自动填充
+                        if mfasecret:
+                            try:
+                                trace.log(f"检测到 MFA 密钥配置", "INFO")
+
+                                # 清理密钥（移除空格和换行符）
+                                processed_secret = mfasecret.strip().replace(' ', '').replace('\n', '')
+                                trace.log(f"密钥长度: {len(processed_secret)} 字符", "INFO")
+
+                                await self.totp.measure_skew(page)
+
+                                # 尝试多次验证（最多3次）
+                                max_attempts = 3
+                                for attempt in range(1, max_attempts + 1):
+                                    try:
+                                        # 生成 MFA 验证码（剩余有效期不足时先等到下一个窗口）
+                                        code = await self.totp.code(processed_secret, trace.log)
+
+                                        trace.log(f"第 {attempt} 次尝试 - 生成验证码: {code} (剩余有效期: {self.totp.remaining():.0f} 秒)", "INFO")
+
+                                        # 清空输入框并填充验证码
+                                        input_selectors = [
+                                            'input[name="app_otp"]',
+                                            'input[name="otp"]',
+                                            'input[id="app_totp"]',
+                                            'input.js-verification-code-input-auto-submit'
+                                        ]
+
+                                        input_element = None
+                                        for selector in input_selectors:
+                                            try:
+                                                input_element = page.locator(selector).first
+                                                await input_element.clear(timeout=3000)
+                                                await input_element.fill(code, timeout=3000)
+                                                trace.log(f"使用选择器 {selector} 填充成功", "INFO")
                                                 break
-                                            else:
-                                                # 检查是否有错误提示
-                                                error_text = await page.text_content('body')
-                                                if 'failed' in error_text.lower() or 'incorrect' in error_text.lower():
-                                                    self.log(f"验证码 {code} 被拒绝", "WARN")
-
-                                                    if attempt < max_attempts:
-                                                        # 等待下一个时间窗口（30秒）
-                                                        remaining = 30 - (int(current_time) % 30)
-                                                        self.log(f"等待 {remaining} 秒进入下一个时间窗口...", "INFO")
-                                                        await asyncio.sleep(remaining + 1)
-
-                                                        # 刷新页面重试
-                                                        await page.reload(timeout=10000)
-                                                        await asyncio.sleep(2)
-                                                    else:
-                                                        self.log(f"已尝试 {max_attempts} 次，MFA 验证失败", "ERROR")
-                                                        raise Exception(f"MFA 验证失败（已尝试 {max_attempts} 次）")
-                                                else:
-                                                    self.log("页面仍在两步验证，但未检测到错误", "WARN")
-                                                    raise Exception("MFA 验证状态未知")
+                                            except:
+                                                continue
 
-                                        except Exception as e:
-                                            if attempt == max_attempts:
-                                                raise
-                                            else:
-                                                self.log(f"第 {attempt} 次尝试失败: {e}", "WARN")
+                                        if not input_element:
+                                            raise Exception("无法找到 MFA 输入框")
+
+                                        # 提交验证码 - 尝试多种按钮选择器
+                                        # 注意：某些 GitHub 2FA 页面会在输入完成后自动提交，无需点击按钮
+                                        submit_selectors = [
+                                            'button:has-text("Verify")',  # GitHub 2FA 页面的 Verify 按钮
+                                            'button[type="submit"]',
+                                            'input[type="submit"]',
+                                            'button.btn-primary'
+                                        ]
+
+                                        submitted = False
+                                        for selector in submit_selectors:
+                                            try:
+                                                submit_btn = page.locator(selector).first
+                                                if await submit_btn.count() > 0:
+                                                    await submit_btn.click(timeout=5000)
+                                                    trace.log(f"使用选择器 {selector} 点击提交按钮成功", "INFO")
+                                                    submitted = True
+                                                    break
+                                            except:
                                                 continue
 
-                                except ImportError:
-                                    self.log("未安装 pyotp，需要手动验证", "WARN")
-                                    raise Exception("pyotp not installed")
-                                except Exception as e:
-                                    self.log(f"MFA 自动填充失败: {e}，回退到手动输入", "WARN")
-                                    # 截图当前状态
-                                    self.screenshot_count += 1
-                                    await page.screenshot(path=f"{self.screenshot_count:02d}_totp_failed.png")
-                                    self.screenshots.append(f"{self.screenshot_count:02d}_totp_failed.png")
-
-                            # 如果 MFA 失败或未配置，等待手动输入
-                            if 'two-factor' in page.url or 'two_factor' in page.url:
-                                self.tg.send(f"⚠️ <b>需要 GitHub 两步验证</b>\n\n请在 {TWO_FACTOR_WAIT} 秒内完成")
-                                self.tg.send_photo(f_2fa, "GitHub 两步验证页面")
-
-                                for i in range(TWO_FACTOR_WAIT):
-                                    await asyncio.sleep(1)
-                                    if i % 10 == 0:
-                                        await page.reload(timeout=10000)
+                                        if not submitted:
+                                            # 如果没有找到提交按钮，可能是自动提交的表单
+                                            trace.log("未找到提交按钮，可能是自动提交表单", "INFO")
+
+                                        trace.log(f"等待验证结果...", "INFO")
+
+                                        # 离开两步验证页，或出现错误提示
+                                        await self.waits.until(
+                                            'MFA 验证',
+                                            first_of(
+                                                url_matches(page, exclude=('two-factor', 'two_factor')),
+                                                page.wait_for_selector('.flash-error', timeout=0)
+                                            ),
+                                            timeout=10, legacy=3, log=trace.log
+                                        )
+
+                                        # 检查是否验证成功
                                         if 'two-factor' not in page.url and 'two_factor' not in page.url:
-                                            self.log("2FA 验证成功", "SUCCESS")
+                                            trace.log("MFA 验证成功！", "SUCCESS")
                                             break
-                                else:
-                                    self.log("2FA 验证超时", "ERROR")
-                                    self.notify(username, False, "2FA 验证超时")
-                                    return False
-
-                        # 处理设备验证（如果需要）
-                        if 'sessions/verified-device' in page.url:
-                            self.log(f"需要设备验证，等待 {DEVICE_VERIFY_WAIT} 秒...", "WARN")
-                            self.screenshot_count += 1
-                            f_device = f"{self.screenshot_count:02d}_github_device.png"
-                            await page.screenshot(path=f_device)
-                            self.screenshots.append(f_device)
-                            self.tg.send(f"⚠️ <b>需要 GitHub 设备验证</b>\n\n请在 {DEVICE_VERIFY_WAIT} 秒内完成")
-                            self.tg.send_photo(f_device, "GitHub 设备验证页面")
-
-                            for i in range(DEVICE_VERIFY_WAIT):
-                                await asyncio.sleep(1)
-                                if i % 10 == 0:
-                                    await page.reload(timeout=10000)
-                                    if 'verified-device' not in page.url:
-                                        self.log("设备验证成功", "SUCCESS")
-                                        break
+                                        else:
+                                            # 检查是否有错误提示
+                                            error_text = await page.text_content('body')
+                                            if 'failed' in error_text.lower() or 'incorrect' in error_text.lower():
+                                                trace.log(f"验证码 {code} 被拒绝", "WARN")
+                                                self.metrics.inc('totp_rejections')
+
+                                                if attempt < max_attempts:
+                                                    # 错误页仍带有输入框，下一次尝试会等到新窗口再直接重填；输入框不在时才刷新
+                                                    if not await self.waits.until(
+                                                        'MFA 输入框',
+                                                        page.wait_for_selector(', '.join(input_selectors), timeout=0),
+                                                        timeout=3, legacy=2, log=trace.log
+                                                    ):
+                                                        await page.reload(timeout=10000)
+                                                else:
+                                                    trace.log(f"已尝试 {max_attempts} 次，MFA 验证失败", "ERROR")
+                                                    raise Exception(f"MFA 验证失败（已尝试 {max_attempts} 次）")
+                                            else:
+                                                trace.log("页面仍在两步验证，但未检测到错误", "WARN")
+                                                raise Exception("MFA 验证状态未知")
+
+                                    except Exception as e:
+                                        if attempt == max_attempts:
+                                            raise
+                                        else:
+                                            trace.log(f"第 {attempt} 次尝试失败: {e}", "WARN")
+                                            continue
+
+                            except ImportError:
+                                trace.log("未安装 pyotp，需要手动验证", "WARN")
+                                raise Exception("pyotp not installed")
+                            except Exception as e:
+                                trace.log(f"MFA 自动填充失败: {e}，回退到手动输入", "WARN")
+                                # 截图当前状态
+                                await trace.screenshot(page, "totp_failed", alert=True)
+
+                        # 如果 MFA 失败或未配置，等待手动输入
+                        if 'two-factor' in page.url or 'two_factor' in page.url:
+                            prompt_id = await self.tg.prompt(
+                                f"⚠️ <b>需要 GitHub 两步验证</b>\n\n账号: {username}\n"
+                                f"请在 {TWO_FACTOR_WAIT} 秒内完成，或直接回复本消息发送验证码"
+                            )
+                            if f_2fa:
+                                data, filename = f_2fa
+                                self.tg.send_photo(data, "GitHub 两步验证页面", filename)
+
+                            if await self.wait_verification(page, ('two-factor', 'two_factor'), TWO_FACTOR_WAIT, trace,
+                                                            prompt_id):
+                                trace.log("2FA 验证成功", "SUCCESS")
                             else:
-                                self.log("设备验证超时", "ERROR")
-                                self.notify(username, False, "设备验证超时")
+                                trace.failure = FAILURE_VERIFICATION
+                                trace.log("2FA 验证超时", "ERROR")
+                                await trace.screenshot(page, "2fa_超时", alert=True)
+                                self.notify(trace, False, "2FA 验证超时")
                                 return False
 
-                        # 处理 OAuth 授权页面（如果需要）
-                        if 'github.com' in page.url and ('authorize' in page.url or 'login/oauth' in page.url):
-                            self.log("检测到 GitHub OAuth 授权页面", "WARN")
-                            self.screenshot_count += 1
-                            await page.screenshot(path=f"{self.screenshot_count:02d}_oauth_授权.png")
-                            self.screenshots.append(f"{self.screenshot_count:02d}_oauth_授权.png")
+                    # 处理设备验证（如果需要）
+                    if 'sessions/verified-device' in page.url:
+                        trace.log(f"需要设备验证，等待 {DEVICE_VERIFY_WAIT} 秒...", "WARN")
+                        trace.timer.step('device_verify')
+                        f_device = await trace.screenshot(page, "github_device", alert=True)
+                        prompt_id = await self.tg.prompt(
+                            f"⚠️ <b>需要 GitHub 设备验证</b>\n\n账号: {username}\n"
+                            f"请在 {DEVICE_VERIFY_WAIT} 秒内完成，或直接回复本消息发送邮件中的验证码"
+                        )
+                        if f_device:
+                            data, filename = f_device
+                            self.tg.send_photo(data, "GitHub 设备验证页面", filename)
+
+                        if await self.wait_verification(page, ('verified-device',), DEVICE_VERIFY_WAIT, trace,
+                                                        prompt_id):
+                            trace.log("设备验证成功", "SUCCESS")
+                        else:
+                            trace.failure = FAILURE_VERIFICATION
+                            trace.log("设备验证超时", "ERROR")
+                            await trace.screenshot(page, "设备验证超时", alert=True)
+                            self.notify(trace, False, "设备验证超时")
+                            return False
 
-                            # 尝试自动点击授权按钮
-                            try:
-                                # 查找授权按钮（多种可能的选择器）
-                                authorize_selectors = [
-                                    'button[type="submit"][name="authorize"]',
-                                    'button:has-text("Authorize")',
-                                    'input[type="submit"][value="Authorize"]',
-                                    'button.btn-primary:has-text("Authorize")'
-                                ]
-
-                                authorized = False
-                                for selector in authorize_selectors:
-                                    try:
-                                        authorize_btn = page.locator(selector).first
-                                        if await authorize_btn.count() > 0:
-                                            self.log(f"找到授权按钮，自动点击授权", "INFO")
-                                            await authorize_btn.click()
-                                            await asyncio.sleep(3)
-                                            authorized = True
-                                            break
-                                    except:
-                                        continue
+                    # 处理 OAuth 授权页面（如果需要）
+                    if GITHUB_DOMAIN in page.url and ('authorize' in page.url or 'login/oauth' in page.url):
+                        trace.log("检测到 GitHub OAuth 授权页面", "WARN")
+                        trace.timer.step('oauth')
+                        await trace.screenshot(page, "oauth_授权")
 
-                                if not authorized:
-                                    self.log("未找到授权按钮，可能已授权或需要手动操作", "WARN")
-                            except Exception as e:
-                                self.log(f"处理 OAuth 授权时出错: {e}", "WARN")
-
-                    # 等待重定向
-                    self.log("步骤4: 等待重定向", "STEP")
-                    for i in range(60):
-                        if 'claw.cloud' in page.url and 'signin' not in page.url.lower():
-                            self.log("重定向成功！", "SUCCESS")
-                            break
-                        await asyncio.sleep(1)
-                    else:
-                        self.log("重定向超时", "ERROR")
-                        self.notify(username, False, "重定向超时")
-                        return False
-
-                    self.screenshot_count += 1
-                    await page.screenshot(path=f"{self.screenshot_count:02d}_完成.png")
-                    self.screenshots.append(f"{self.screenshot_count:02d}_完成.png")
-                    print('\n✅ ClawCloud 登录成功!\n')
-                    return True
+                        # 尝试自动点击授权按钮
+                        try:
+                            # 查找授权按钮（多种可能的选择器）
+                            authorize_selectors = [
+                                'button[type="submit"][name="authorize"]',
+                                'button:has-text("Authorize")',
+                                'input[type="submit"][value="Authorize"]',
+                                'button.btn-primary:has-text("Authorize")'
+                            ]
+
+                            authorized = False
+                            for selector in authorize_selectors:
+                                try:
+                                    authorize_btn = page.locator(selector).first
+                                    if await authorize_btn.count() > 0:
+                                        trace.log(f"找到授权按钮，自动点击授权", "INFO")
+                                        await authorize_btn.click()
+                                        authorized = True
+                                        break
+                                except:
+                                    continue
 
-                except Exception as e:
-                    self.log(f"异常: {e}", "ERROR")
-                    self.screenshot_count += 1
-                    await page.screenshot(path=f"{self.screenshot_count:02d}_异常.png")
-                    self.screenshots.append(f"{self.screenshot_count:02d}_异常.png")
-                    self.notify(username, False, str(e))
+                            if not authorized:
+                                trace.log("未找到授权按钮，可能已授权或需要手动操作", "WARN")
+                        except Exception as e:
+                            trace.log(f"处理 OAuth 授权时出错: {e}", "WARN")
+
+                # 等待重定向
+                trace.log("步骤4: 等待重定向", "STEP")
+                trace.timer.step('redirect')
+                redirected = await self.waits.until(
+                    '重定向回 ClawCloud', page.wait_for_url(self.detector.url_ok, wait_until='commit', timeout=0),
+                    timeout=60, legacy=0, log=trace.log
+                )
+                if redirected:
+                    trace.log("重定向成功！", "SUCCESS")
+                else:
+                    trace.log("重定向超时", "ERROR")
+                    await trace.screenshot(page, "重定向超时", alert=True)
+                    self.notify(trace, False, "重定向超时")
                     return False
 
-                finally:
-                    await browser.close()
+                await trace.screenshot(page, "完成")
+                self.sessions.save('clawcloud', username, await context.storage_state())
+                print(f'\n✅ ClawCloud 账号 {username} 登录成功!\n')
+                self.notify(trace, True)
+                return True
+
+            except Exception as e:
+                trace.log(f"异常: {e}", "ERROR")
+                await trace.screenshot(page, "异常", alert=True)
+                self.notify(trace, False, str(e))
+                return False
 
         except ImportError:
-            self.log("未安装 playwright，跳过 ClawCloud 登录", "WARN")
-            self.log("安装命令: pip install playwright && playwright install chromium", "INFO")
+            trace.log("未安装 playwright，跳过 ClawCloud 登录", "WARN")
+            trace.log("安装命令: pip install playwright && playwright install chromium", "INFO")
             return False
         except Exception as e:
-            self.log(f"ClawCloud 登录失败: {e}", "ERROR")
+            trace.log(f"ClawCloud 登录失败: {e}", "ERROR")
             return False
 
+        finally:
+            # 只关闭本账号的上下文，浏览器留给其他账号继续使用
+            if context:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+
     async def run(self, accounts: List[Dict]) -> bool:
         """
         批量登录 ClawCloud 账号
@@ -741,117 +3069,564 @@ class ClawCloudLogin:
         print('开始 ClawCloud 登录')
         print('='*50 + '\n')
 
-        success_count = 0
-        fail_count = 0
-        success_accounts = []
-        failed_accounts = []
+        try:
+            await self.start()
+        except ImportError:
+            print('⚠️ 未安装 playwright，跳过 ClawCloud 登录')
+            print('ℹ️ 安装命令: pip install playwright && playwright install chromium')
+            await self.close()
+            return False
 
-        for i, account in enumerate(accounts, 1):
+        # 所有账号都访问同一站点：限制并发数，并让相邻两次启动之间保持随机间隔
+        limiter = HostLimiter(CLAWCLOUD_CONCURRENCY, CLAWCLOUD_CONCURRENCY, CLAWCLOUD_DELAY, self.metrics, 'clawcloud')
+
+        async def login_one(i: int, account: Dict) -> Optional[bool]:
             username = account.get('username')
             password = account.get('password')
             mfasecret = account.get('mfasecret')  # 从账号配置中读取 MFA 密钥
 
             if not username or not password:
                 print(f'账号 {i} 配置不完整，跳过')
-                fail_count += 1
-                failed_accounts.append(username or f'账号{i}')
-                continue
+                self.results.write('clawcloud', username or f'账号{i}', 'failure', FAILURE_CONFIG)
+                return None
 
-            print(f'\n[{i}/{len(accounts)}] 正在登录账号: {username}')
+            spent = 0.0
 
-            try:
-                is_logged_in = await self.login_account(username, password, mfasecret)
+            async def attempt(last: bool) -> Tuple[bool, str]:
+                nonlocal spent
+                async with limiter.slot(CLAW_CLOUD_DOMAIN) as slot:
+                    print(f'\n[{i}/{len(accounts)}] 正在登录账号: {username}')
+                    started = time.monotonic()
+                    try:
+                        ok = await self.login_account(username, password, mfasecret, last, slot)
+                    except Exception as e:
+                        print(f'❌ 账号 {username} 登录异常: {e}')
+                        ok = False
+                    spent += time.monotonic() - started
+                    failure = None if ok else self.failures.pop(username, FAILURE_TRANSIENT)
+                    # 耗时包含等待人工验证的时间，只用超时、网络错误调整并发
+                    slot.timed = False
+                    slot.overload = failure if failure == FAILURE_TRANSIENT else None
+                return ok, failure
+
+            # 临时性失败退避后重试，等待期间让出名额
+            is_logged_in, failure, attempts = await self.retries.run(username, attempt)
+            if attempts:
+                # 每个账号只记录一次最终结果，耗时为各次尝试之和
+                self.state.record('clawcloud', username, is_logged_in, spent)
+            self.results.write('clawcloud', username, 'success' if is_logged_in else 'failure', failure, spent,
+                               self.screenshot_refs.pop(username, None), attempts=attempts)
 
-                if is_logged_in:
-                    success_count += 1
-                    success_accounts.append(username)
-                    print(f'✅ 账号 {username} 登录成功!')
-                else:
-                    fail_count += 1
-                    failed_accounts.append(username)
-                    print(f'❌ 账号 {username} 登录失败')
-            except Exception as e:
-                fail_count += 1
-                failed_accounts.append(username)
-                print(f'❌ 账号 {username} 登录异常: {e}')
+            if is_logged_in:
+                print(f'✅ 账号 {username} 登录成功!')
+            else:
+                print(f'❌ 账号 {username} 登录失败')
+            return is_logged_in
 
-            # 随机延时 3-8 秒
-            if i < len(accounts):
-                delay = random.randint(3000, 8000)
-                print(f'等待 {delay/1000:.1f} 秒后继续...\n')
-                await asyncio.sleep(delay / 1000)
+        try:
+            await asyncio.gather(
+                *(login_one(i, account) for i, account in enumerate(accounts, 1))
+            )
+        finally:
+            await self.close()
+
+        success_accounts, failed_accounts, skipped, _ = ResultSink.summarize(self.results.records, 'clawcloud')
+        success_count = len(success_accounts)
+        fail_count = len(failed_accounts)
 
         print('\n' + '='*50)
         print(f'ClawCloud 登录完成! 成功: {success_count}, 失败: {fail_count}')
+        print(self.waits.summary())
+        self.resources.report()
+        self.metrics.set('wait_seconds', round(self.waits.waited, 3), provider='clawcloud')
+        self.metrics.set('wait_legacy_seconds', self.waits.legacy, provider='clawcloud')
         print('='*50 + '\n')
 
-        # 发送汇总通知
-        if self.tg.enabled:
-            now_time = format_to_iso(datetime.utcnow() + timedelta(hours=8))
-            summary = f'🌐 <b>ClawCloud 批量登录完成</b>\n\n'
-            summary += f'<b>时间:</b> {now_time}\n'
-            summary += f'<b>总计:</b> {len(accounts)} 个账号\n'
-            summary += f'<b>成功:</b> {success_count} ✅\n'
-            summary += f'<b>失败:</b> {fail_count} ❌\n'
+        # 从结果流生成汇总通知（分片运行时由 merge 统一发送）
+        if self.tg.enabled and self.send_summary:
+            self.tg.send(self.build_summary(success_accounts, failed_accounts, skipped))
 
-            if success_accounts:
-                summary += f'\n<b>成功账号:</b>\n'
-                for acc in success_accounts:
-                    summary += f'  • {acc}\n'
+        return success_count > 0
 
-            if failed_accounts:
-                summary += f'\n<b>失败账号:</b>\n'
-                for acc in failed_accounts:
-                    summary += f'  • {acc}\n'
+    @staticmethod
+    def build_summary(success_accounts: List[str], failed_accounts: List[Tuple[str, str]], skipped: int = 0) -> str:
+        """构建汇总通知消息"""
+        now_time = format_to_iso(datetime.utcnow() + timedelta(hours=8))
+        summary = f'🌐 <b>ClawCloud 批量登录完成</b>\n\n'
+        summary += f'<b>时间:</b> {now_time}\n'
+        summary += f'<b>总计:</b> {len(success_accounts) + len(failed_accounts)} 个账号\n'
+        summary += f'<b>成功:</b> {len(success_accounts)} ✅\n'
+        summary += f'<b>失败:</b> {len(failed_accounts)} ❌\n'
+        if skipped:
+            summary += f'<b>跳过:</b> {skipped} 个（{STATE_FRESH_HOURS:g} 小时内已登录成功）\n'
+        summary += format_accounts(success_accounts, failed_accounts)
+        return summary
 
-            self.tg.send(summary)
 
-        return success_count > 0
+# ==================== 主程序 ====================
+class Provider:
+    """
+    登录提供商注册项
+
+    只有账号文件中有账号时才导入该提供商的依赖并初始化，没有账号的提供商不产生任何启动开销
+    """
+
+    def __init__(self, name: str, label: str, accounts_file: str, modules: Tuple[str, ...], factory, key,
+                 validate, inactivity_days: float, default_cost: float, concurrency: int):
+        self.name = name
+        self.label = label
+        self.accounts_file = accounts_file
+        self.modules = modules
+        self.factory = factory
+        self.key = key  # 账号的稳定标识，用于去重、分片与账号状态
+        self.validate = validate  # 校验账号，返回错误原因
+        self.inactivity_days = inactivity_days  # 超过该天数未登录会被服务商回收
+        self.default_cost = default_cost  # 没有历史记录时单个账号的预计耗时（秒）
+        self.concurrency = max(1, concurrency)
+
+    def load(self, metrics: RunMetrics):
+        """导入提供商依赖并记录耗时（缺少的依赖留给提供商自己处理）"""
+        with metrics.span(self.name, 'import'):
+            for module in self.modules:
+                try:
+                    importlib.import_module(module)
+                except ImportError:
+                    pass
 
+    def create(self, telegram: Telegram, metrics: RunMetrics, driver: BrowserDriver, state: AccountState,
+               results: ResultSink):
+        """初始化提供商"""
+        return self.factory(telegram, metrics=metrics, driver=driver, state=state, results=results)
 
-# ==================== 主程序 ====================
-async def main():
+    def shard_of(self, account: Dict, count: int) -> int:
+        """
+        账号所属的分片（从 1 开始，共 count 个）
+
+        按账号标识的 sha256 取模分配，账号增减不会让其他账号换到别的分片
+        """
+        digest = hashlib.sha256(f'{self.name}:{self.key(account)}'.encode()).hexdigest()
+        return int(digest[:8], 16) % count + 1
+
+    def prioritize(self, accounts: List[Dict], state: AccountState) -> Tuple[List[Dict], int]:
+        """
+        按保活紧迫度排序，并按预计耗时装入剩余的运行时间
+
+        紧迫度 = 距上次成功登录的时间 / 不活跃期限（从未记录成功的账号视为 1）；预计耗时取历史平均耗时，
+        按并发数折算成可用时间。装不下的账号排到最后，时间有剩余时仍会执行
+
+        Returns:
+            Tuple[List[Dict], int]: (排序后的账号, 超出时间预算的账号数)
+        """
+        now = time.time()
+
+        def urgency(account: Dict) -> float:
+            info = state.get(self.name, self.key(account))
+            if not info or not info['last_success']:
+                return 1.0
+            return (now - info['last_success']) / (self.inactivity_days * 86400)
+
+        def cost(account: Dict) -> float:
+            info = state.get(self.name, self.key(account))
+            return info['avg_duration'] if info and info.get('avg_duration') else self.default_cost
+
+        # 越紧迫越靠前，同样紧迫时耗时短的优先
+        ordered = sorted(accounts, key=lambda account: (-urgency(account), cost(account)))
+        budget = max(0.0, deadline_left()) * self.concurrency
+        scheduled = []
+        overflow = []
+        used = 0.0
+        for account in ordered:
+            if used + cost(account) <= budget:
+                scheduled.append(account)
+                used += cost(account)
+            else:
+                overflow.append(account)
+        return scheduled + overflow, len(overflow)
+
+
+def validate_serv00(account: Dict) -> Optional[str]:
+    """校验 Serv00 账号，返回错误原因；panelnum 统一为数字字符串"""
+    for field in ('username', 'password'):
+        if not isinstance(account.get(field), str) or not account[field]:
+            return f'缺少 {field}'
+    if account.get('panelnum') in (None, ''):
+        return '缺少 panelnum'
+    panelnum = str(account['panelnum']).strip()
+    if not panelnum.isdigit():
+        return 'panelnum 应为面板编号（数字）'
+    account['panelnum'] = panelnum
+    return None
+
+
+def validate_clawcloud(account: Dict) -> Optional[str]:
+    """校验 ClawCloud 账号，返回错误原因"""
+    for field in ('username', 'password'):
+        if not isinstance(account.get(field), str) or not account[field]:
+            return f'缺少 {field}'
+    if account.get('mfasecret') is not None and not isinstance(account['mfasecret'], str):
+        return 'mfasecret 应为字符串'
+    return None
+
+
+ACCOUNT_RECORD_START_RE = re.compile(r'\n[\s,]*\{')  # 格式错误后从这里继续：新的一行以 '{' 开始
+
+
+class AccountLoader:
+    """
+    流式读取账号
+
+    依次读取环境变量 <NAME>_ACCOUNTS_JSON（例如由 GitHub Secrets 注入）与账号文件
+    （路径可用 <NAME>_ACCOUNTS_FILE 覆盖），两者都支持 JSON 数组或 JSON Lines。
+    文件按块读取、逐条解析，每条账号解析后立即校验并去重，再交给调用方，不需要一次读入整个文件。
+    无效的账号记入 invalid，重复的账号只保留第一个。
+    """
+
+    chunk_size = 64 * 1024
+    max_record = 1024 * 1024  # 单条账号记录的最大长度
+
+    def __init__(self, provider: 'Provider'):
+        self.provider = provider
+        self.env_name = f'{provider.name.upper()}_ACCOUNTS_JSON'
+        self.path = os.getenv(f'{provider.name.upper()}_ACCOUNTS_FILE', provider.accounts_file)
+        self.seen = set()
+        self.loaded = 0
+        self.duplicates = 0
+        self.invalid = []  # [(账号名, 原因)]
+
+    async def __aiter__(self):
+        env_value = os.getenv(self.env_name, '').strip()
+        if env_value:
+            try:
+                async for account in self.accept(self.env_name, self.parse(self.iter_text(env_value))):
+                    yield account
+            except Exception as e:
+                print(f'读取环境变量 {self.env_name} 时出错: {e}')
+
+        try:
+            async for account in self.accept(self.path, self.parse(self.iter_file(self.path))):
+                yield account
+        except FileNotFoundError:
+            if not env_value:
+                print(f'未找到 {self.path} 文件，跳过 {self.provider.label} 登录')
+        except Exception as e:
+            print(f'读取 {self.path} 文件时出错: {e}')
+
+        if self.loaded or self.invalid:
+            print(f'已加载 {self.loaded} 个 {self.provider.label} 账号')
+        if self.duplicates:
+            print(f'⚠️ 忽略 {self.duplicates} 个重复的 {self.provider.label} 账号')
+        for label, reason in self.invalid:
+            print(f'⚠️ {self.provider.label} 账号 {label} 配置无效: {reason}')
+
+    async def accept(self, source: str, records):
+        """校验、去重"""
+        n = 0
+        async for record in records:
+            n += 1
+            if isinstance(record, ValueError):
+                self.invalid.append((f'{source}#{n}', str(record)))
+                continue
+            if not isinstance(record, dict):
+                self.invalid.append((f'{source}#{n}', '不是 JSON 对象'))
+                continue
+            reason = self.provider.validate(record)
+            if reason:
+                self.invalid.append((record.get('username') or f'{source}#{n}', reason))
+                continue
+            key = self.provider.key(record)
+            if key in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(key)
+            self.loaded += 1
+            yield record
+
+    @staticmethod
+    async def iter_text(text: str):
+        yield text
+
+    async def iter_file(self, path: str):
+        import aiofiles
+
+        async with aiofiles.open(path, mode='r', encoding='utf-8') as f:
+            while True:
+                chunk = await f.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    @classmethod
+    async def parse(cls, chunks):
+        """
+        从文本块中逐个解析 JSON 值
+
+        顶层可以是一个 JSON 数组，也可以是以换行分隔的多个 JSON 对象（JSON Lines）。
+        无法解析的记录先继续读取，直到文本结束或超过 max_record 个字符仍无法解析才视为格式错误，
+        缓冲区不会无限增长。格式错误的记录不会中断解析：产出一个 ValueError 代替该记录，
+        然后从下一个以 '{' 开头的行继续
+        """
+        decoder = json.JSONDecoder()
+        buffer = ''
+        pos = 0
+        line = 1  # buffer 开头所在的行号
+        eof = False
+        skipping = False  # 正在丢弃格式错误的记录，直到下一条记录开始
+        chunks = chunks.__aiter__()
+
+        async def read_more():
+            nonlocal buffer, pos, line, eof
+            line += buffer.count('\n', 0, pos)
+            buffer = buffer[pos:]
+            pos = 0
+            try:
+                buffer += await chunks.__anext__()
+            except StopAsyncIteration:
+                eof = True
+
+        while True:
+            if skipping:
+                match = ACCOUNT_RECORD_START_RE.search(buffer, pos)
+                if match:
+                    pos = match.end() - 1
+                    skipping = False
+                elif eof:
+                    return
+                else:
+                    # 保留最后一个字符，下一条记录开头的换行可能在块末尾
+                    pos = max(pos, len(buffer) - 1)
+                    await read_more()
+                continue
+
+            # 跳过空白、数组括号、分隔符与 BOM
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]\ufeff':
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    return
+                await read_more()
+                continue
+
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # 记录可能只是还没读完（块的边界可以落在任何位置），读到结尾或超过 max_record 才算格式错误
+                if not eof and len(buffer) - pos < cls.max_record:
+                    await read_more()
+                    continue
+                yield ValueError(f'第 {line + buffer.count(chr(10), 0, pos)} 行 JSON 格式错误: {e.msg}')
+                # 从下一条记录的开头继续
+                match = ACCOUNT_RECORD_START_RE.search(buffer, pos)
+                if match:
+                    pos = match.end() - 1
+                elif eof:
+                    return
+                else:
+                    skipping = True
+                continue
+            pos = end
+            yield value
+
+
+PROVIDERS = (
+    Provider('serv00', 'Serv00', 'accounts.json',
+             ('aiohttp',) if SERV00_HTTP_LOGIN else (), Serv00Login,
+             lambda account: f"{account.get('username')}@panel{account.get('panelnum')}", validate_serv00,
+             SERV00_INACTIVITY_DAYS, 10, SERV00_CONCURRENCY),
+    Provider('clawcloud', 'ClawCloud', 'clawcloud_accounts.json',
+             ('playwright.async_api',), ClawCloudLogin,
+             lambda account: str(account.get('username')), validate_clawcloud,
+             CLAWCLOUD_INACTIVITY_DAYS, 60, CLAWCLOUD_CONCURRENCY),
+)
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """解析 --shard i/N"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('格式应为 i/N，例如 1/4')
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError('分片序号应在 1 到 N 之间')
+    return index, count
+
+
+async def merge(paths: List[str]):
+    """
+    合并各分片的结果文件，按提供商发送与单次运行相同的汇总通知
+
+    Args:
+        paths: 分片结果文件路径（JSON Lines）
+    """
+    telegram = Telegram()
+    records = []
+    shards = []
+    interrupted = []
+    for path in paths:
+        try:
+            lines = ResultSink.read(path)
+        except Exception as e:
+            print(f'读取分片结果 {path} 时出错: {e}')
+            continue
+        header = lines[0] if lines and lines[0].get('event') == 'run' else {}
+        shard = header.get('shard') or [1, 1]
+        shards.append(shard)
+        if lines[-1:] and lines[-1].get('event') != 'end':
+            interrupted.append(f'{shard[0]}/{shard[1]}')
+        records += lines
+
+    counts = {shard[1] for shard in shards}
+    seen = {shard[0] for shard in shards}
+    missing = [f'{i}/{count}' for count in counts for i in range(1, count + 1) if i not in seen]
+    if len(counts) > 1:
+        print(f'⚠️ 分片总数不一致: {sorted(counts)}')
+    if missing:
+        print(f'⚠️ 缺少分片结果: {", ".join(missing)}')
+    if interrupted:
+        print(f'⚠️ 分片未正常结束（结果可能不完整）: {", ".join(interrupted)}')
+    print(f'已读取 {len(shards)} 个分片结果')
+
+    try:
+        for provider in PROVIDERS:
+            success_accounts, failed_accounts, skipped, errors = ResultSink.summarize(records, provider.name)
+            if not success_accounts and not failed_accounts and not skipped and not errors:
+                continue
+
+            print(f'{provider.label}: 成功 {len(success_accounts)}, 失败 {len(failed_accounts)}, 跳过 {skipped}')
+            message = provider.factory.build_summary(success_accounts, failed_accounts, skipped)
+            if missing:
+                message += f'\n⚠️ 缺少分片结果: {", ".join(missing)}\n'
+            if interrupted:
+                message += f'\n⚠️ 分片未正常结束: {", ".join(interrupted)}\n'
+            for error in errors:
+                message += f'\n❌ {error}\n'
+            telegram.send(message)
+    finally:
+        await telegram.close()
+
+
+def print_startup_profile(metrics: RunMetrics, main_started: float):
+    """打印启动耗时：脚本自身导入、各提供商依赖导入与首个账号完成登录的时间"""
+    print('\n' + '='*60)
+    print('启动耗时')
+    print(f'{"阶段":<36}{"耗时(s)":>10}')
+    print(f'{"脚本导入":<36}{main_started - PROCESS_STARTED:>10.3f}')
+    for span in metrics.spans:
+        if span['step'] in ('import', 'browser_launch'):
+            print(f'{span["provider"] + " " + span["step"]:<36}{span["duration"]:>10.3f}')
+    for (name, labels), value in sorted(metrics.values.items()):
+        if name == 'time_to_first_login_seconds':
+            print(f'{dict(labels)["provider"] + " 首个账号完成":<36}{value:>10.3f}')
+    print('='*60 + '\n')
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='Serv00 & ClawCloud 统一保活脚本')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='打印导入耗时与各提供商首个账号完成登录的时间')
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N',
+                        help='只处理第 i 个分片（共 N 个）的账号，结果写入分片结果文件，不发送汇总通知')
+    parser.add_argument('--shard-results', metavar='PATH',
+                        help='分片结果文件路径（默认 results-shard-i-of-N.jsonl）')
+    subparsers = parser.add_subparsers(dest='command')
+    merge_parser = subparsers.add_parser('merge', help='合并分片结果文件并发送汇总通知')
+    merge_parser.add_argument('paths', nargs='+', metavar='PATH', help='分片结果文件')
+    return parser.parse_args(argv)
+
+
+async def main(args: Optional[argparse.Namespace] = None):
     """主函数"""
+    args = args or parse_args([])
+    if args.command == 'merge':
+        await merge(args.paths)
+        return
+
+    main_started = time.monotonic()
     print('\n' + '='*60)
     print('Serv00 & ClawCloud 统一保活脚本')
     print('='*60 + '\n')
 
-    # 初始化 Telegram
+    # 初始化 Telegram、运行指标与共享浏览器（Serv00 与 ClawCloud 共用一个 Chromium，首次使用时才启动）
     telegram = Telegram()
+    metrics = RunMetrics()
+    metrics.set('startup_import_seconds', round(main_started - PROCESS_STARTED, 4))
+    driver = BrowserDriver(metrics)
+    state = AccountState()
+    if args.shard:
+        results = ResultSink(args.shard_results or f'results-shard-{args.shard[0]}-of-{args.shard[1]}.jsonl',
+                             args.shard)
+    else:
+        results = ResultSink()
+    progress = RunProgress(telegram, results)
+
+    async def run_provider(provider: Provider):
+        # 读取账号、排序与登录中的任何错误只影响该提供商，不中断其他提供商
+        try:
+            await login_provider(provider)
+        except Exception as e:
+            print(f'❌ {provider.label} 登录出错: {e}')
+            telegram.send(f'❌ <b>{provider.label} 登录出错</b>\n\n{e}')
+            results.error(provider.name, str(e))
+
+    async def login_provider(provider: Provider):
+        # 逐条读取账号：不属于本分片的直接丢弃，最近已登录成功的记为跳过（中断后重新运行时从未完成的账号继续），
+        # 只保留需要登录的账号
+        loader = AccountLoader(provider)
+        pending = []
+        skipped = 0
+        total = 0
+        async for account in loader:
+            if args.shard and provider.shard_of(account, args.shard[1]) != args.shard[0]:
+                continue
+            total += 1
+            if state.is_fresh(provider.name, provider.key(account)):
+                results.write(provider.name, account['username'], 'skipped', panel=account.get('panelnum'))
+                skipped += 1
+            else:
+                pending.append(account)
+
+        # 配置无效的账号在登录开始前就记为失败（分片运行时只由第 1 个分片报告）
+        invalid = loader.invalid if not args.shard or args.shard[0] == 1 else []
+        for label, reason in invalid:
+            results.write(provider.name, label, 'failure', FAILURE_CONFIG, error=reason)
+        if invalid:
+            metrics.set('invalid_accounts', len(invalid), provider=provider.name)
+        if total or invalid:
+            progress.add(provider.name, provider.label, total + len(invalid), len(invalid), skipped)
+        if args.shard and total:
+            print(f'分片 {args.shard[0]}/{args.shard[1]}: {total} 个 {provider.label} 账号')
+        if skipped:
+            print(f'跳过 {skipped} 个 {STATE_FRESH_HOURS:g} 小时内已登录成功的 {provider.label} 账号')
+            metrics.set('skipped_accounts', skipped, provider=provider.name)
+
+        # 没有账号的提供商不导入依赖、不初始化
+        if not pending:
+            return
+
+        # 最接近过期的账号优先，时间不够时尽量多完成紧迫的账号
+        pending, overflow = provider.prioritize(pending, state)
+        if overflow:
+            print(f'⚠️ 预计剩余时间只够 {len(pending) - overflow} 个 {provider.label} 账号，其余 {overflow} 个排在最后')
+            metrics.set('over_budget_accounts', overflow, provider=provider.name)
+        provider.load(metrics)
+        login = provider.create(telegram, metrics, driver, state, results)
+        login.send_summary = not args.shard
+        await login.run(pending)
 
-    # 读取 Serv00 账号配置
-    serv00_accounts = []
-    try:
-        async with aiofiles.open('accounts.json', mode='r', encoding='utf-8') as f:
-            accounts_json = await f.read()
-        serv00_accounts = json.loads(accounts_json)
-        print(f'已加载 {len(serv00_accounts)} 个 Serv00 账号')
-    except FileNotFoundError:
-        print('未找到 accounts.json 文件，跳过 Serv00 登录')
-    except Exception as e:
-        print(f'读取 accounts.json 文件时出错: {e}')
-
-    # 执行 Serv00 登录
-    if serv00_accounts:
-        serv00 = Serv00Login(telegram)
-        await serv00.run(serv00_accounts)
-
-    # 读取 ClawCloud 账号配置
-    clawcloud_accounts = []
     try:
-        async with aiofiles.open('clawcloud_accounts.json', mode='r', encoding='utf-8') as f:
-            accounts_json = await f.read()
-        clawcloud_accounts = json.loads(accounts_json)
-        print(f'已加载 {len(clawcloud_accounts)} 个 ClawCloud 账号')
-    except FileNotFoundError:
-        print('未找到 clawcloud_accounts.json 文件，跳过 ClawCloud 登录')
-    except Exception as e:
-        print(f'读取 clawcloud_accounts.json 文件时出错: {e}')
-
-    # 执行 ClawCloud 登录
-    if clawcloud_accounts:
-        clawcloud = ClawCloudLogin(telegram)
-        await clawcloud.run(clawcloud_accounts)
+        # 各提供商并发执行，共用浏览器预算，各自发送汇总；最慢的一个完成后结束
+        await asyncio.gather(*(run_provider(provider) for provider in PROVIDERS))
+    finally:
+        # 关闭共享浏览器，写完结果流，保存账号状态，等待剩余通知发送完成
+        await driver.close()
+        await results.close()
+        state.close()
+        progress.finish()
+        await telegram.close()
+        metrics.export()
+
+    if args.profile_startup:
+        print_startup_profile(metrics, main_started)
 
     print('\n' + '='*60)
     print('所有保活任务完成!')
@@ -859,4 +3634,4 @@ async def main():
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+离线基准测试
+在本地启动模拟的 Serv00 面板与 ClawCloud/GitHub OAuth 服务器，不访问任何真实服务，
+统计不同账号规模下的吞吐量（账号/分钟）、各步骤耗时与峰值内存
+
+用法:
+    python benchmark.py                                  # Serv00，10/100/1000 个账号
+    python benchmark.py --provider clawcloud --sizes 10  # ClawCloud（需要 Playwright Chromium）
+    python benchmark.py --latency 0.2 --failure-rate 0.05 --json bench.json
+"""
+
+import argparse
+import asyncio
+import html
+import json
+import os
+import random
+import resource
+import secrets
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+from urllib.parse import quote, urlencode
+
+from aiohttp import web
+
+# ==================== 配置 ====================
+FIXTURE_HOST = '127.0.0.1'
+PANEL_COUNT = 16  # 模拟面板数量，面板 N 监听 127.0.0.N，与真实环境一样每个面板是独立主机
+GOOD_PASSWORD = 'correct-password'
+BAD_PASSWORD = 'wrong-password'
+MFA_SECRET = 'JBSWY3DPEHPK3PXP'
+
+
+# ==================== 模拟服务器 ====================
+class FixtureBehavior:
+    """模拟服务器的延迟与故障注入"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        """每个请求先等待模拟延迟，并按故障率返回 502"""
+        self.requests += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if random.random() < self.failure_rate:
+            self.failures += 1
+            return web.Response(status=502, text='Bad Gateway')
+        return await handler(request)
+
+
+def html_page(title: str, body: str) -> web.Response:
+    """返回 HTML 页面"""
+    return web.Response(
+        text=f'<!DOCTYPE html><html><head><title>{title}</title></head><body>{body}</body></html>',
+        content_type='text/html'
+    )
+
+
+class Serv00Panel:
+    """模拟 Serv00 面板：Django 登录表单（data-login-form + CSRF）与带 /logout/ 链接的首页"""
+
+    def __init__(self, behavior: FixtureBehavior):
+        self.behavior = behavior
+        self.sessions = {}
+
+    def login_form(self, token: str, error: str = '') -> web.Response:
+        errors = f'<ul class="errorlist"><li>{error}</li></ul>' if error else ''
+        response = html_page('Logowanie', f'''
+            <form method="post" action="/login/?next=/" data-login-form>
+              <input type="hidden" name="csrfmiddlewaretoken" value="{token}">
+              {errors}
+              <input type="text" name="username" id="id_username">
+              <input type="password" name="password" id="id_password">
+              <button type="submit" class="button button--primary">Zaloguj</button>
+            </form>''')
+        response.set_cookie('csrftoken', token)
+        return response
+
+    async def login(self, request):
+        if request.method == 'GET':
+            return self.login_form(secrets.token_hex(16))
+
+        form = await request.post()
+        token = request.cookies.get('csrftoken')
+        if not token or form.get('csrfmiddlewaretoken') != token:
+            return web.Response(status=403, text='CSRF verification failed')
+
+        if form.get('password') != GOOD_PASSWORD:
+            return self.login_form(token, 'Please enter a correct username and password.')
+
+        session_id = secrets.token_hex(16)
+        self.sessions[session_id] = form.get('username')
+        raise web.HTTPFound('/', headers={'Set-Cookie': f'sessionid={session_id}; Path=/; HttpOnly'})
+
+    async def index(self, request):
+        username = self.sessions.get(request.cookies.get('sessionid'))
+        if not username:
+            raise web.HTTPFound('/login/?next=/')
+        return html_page('Strona główna', f'<p>{username}</p><a href="/logout/">Wyloguj</a>')
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.behavior.middleware])
+        app.router.add_route('*', '/login/', self.login)
+        app.router.add_get('/', self.index)
+        return app
+
+
+class ClawCloudSite:
+    """模拟 ClawCloud：signin 页的 GitHub 按钮 → GitHub OAuth → /callback → 控制台"""
+
+    def __init__(self, behavior: FixtureBehavior):
+        self.behavior = behavior
+        self.github_url = ''
+        self.base_url = ''
+        self.sessions = {}
+
+    async def signin(self, request):
+        if request.cookies.get('claw_session') in self.sessions:
+            raise web.HTTPFound('/')
+        authorize = f'{self.github_url}/login/oauth/authorize?' + urlencode({
+            'client_id': 'bench', 'redirect_uri': f'{self.base_url}/callback'
+        })
+        return html_page('Sign in', f'''
+            <button class="chakra-button" onclick="location.href='{authorize}'">Continue with GitHub</button>''')
+
+    async def callback(self, request):
+        session_id = secrets.token_hex(16)
+        self.sessions[session_id] = request.query.get('code')
+        raise web.HTTPFound('/', headers={'Set-Cookie': f'claw_session={session_id}; Path=/'})
+
+    async def index(self, request):
+        if request.cookies.get('claw_session') not in self.sessions:
+            raise web.HTTPFound('/signin')
+        return html_page('ClawCloud Dashboard', '<h1>Dashboard</h1>')
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.behavior.middleware])
+        app.router.add_get('/signin', self.signin)
+        app.router.add_get('/callback', self.callback)
+        app.router.add_get('/', self.index)
+        return app
+
+
+class GitHubSite:
+    """
+    模拟 GitHub 登录与 OAuth 授权
+
+    用户名包含 mfa 的账号需要 TOTP 两步验证，包含 device 的账号需要设备验证
+    （验证页在 device_delay 秒后自动跳转，模拟用户在邮件中完成验证）
+    """
+
+    def __init__(self, behavior: FixtureBehavior, device_delay: float = 1.0):
+        self.behavior = behavior
+        self.device_delay = device_delay
+        self.sessions = {}
+        self.pending = {}
+        self.authorized = set()
+
+    def user(self, request):
+        return self.sessions.get(request.cookies.get('gh_session'))
+
+    async def authorize(self, request):
+        username = self.user(request)
+        if not username:
+            raise web.HTTPFound('/login?' + urlencode({'return_to': str(request.rel_url)}))
+        redirect_uri = request.query.get('redirect_uri', '')
+        if request.method == 'POST' or username in self.authorized:
+            self.authorized.add(username)
+            raise web.HTTPFound(f'{redirect_uri}?code={quote(username)}')
+        return html_page('Authorize application', f'''
+            <form method="post" action="{html.escape(str(request.rel_url))}">
+              <button type="submit" name="authorize" class="btn-primary">Authorize bench</button>
+            </form>''')
+
+    async def login(self, request):
+        return_to = request.query.get('return_to', '/')
+        return html_page('Sign in to GitHub', f'''
+            <form method="post" action="/session">
+              <input type="hidden" name="return_to" value="{html.escape(return_to)}">
+              <input type="text" name="login">
+              <input type="password" name="password">
+              <input type="submit" value="Sign in">
+            </form>''')
+
+    async def session(self, request):
+        form = await request.post()
+        username = form.get('login', '')
+        return_to = form.get('return_to', '/')
+        if form.get('password') != GOOD_PASSWORD:
+            return html_page('Sign in to GitHub', '<div class="flash-error">Incorrect username or password.</div>')
+
+        token = secrets.token_hex(16)
+        self.pending[token] = (username, return_to)
+        cookie = {'Set-Cookie': f'gh_pending={token}; Path=/'}
+        if 'mfa' in username:
+            raise web.HTTPFound('/sessions/two-factor/app', headers=cookie)
+        if 'device' in username:
+            raise web.HTTPFound('/sessions/verified-device', headers=cookie)
+        return self.complete(token)
+
+    def complete(self, token: str):
+        username, return_to = self.pending.pop(token)
+        session_id = secrets.token_hex(16)
+        self.sessions[session_id] = username
+        raise web.HTTPFound(return_to, headers={'Set-Cookie': f'gh_session={session_id}; Path=/'})
+
+    async def two_factor(self, request):
+        if request.method == 'GET':
+            return html_page('Two-factor authentication', '''
+                <form method="post">
+                  <input type="text" name="app_otp" id="app_totp">
+                  <button type="submit" class="btn-primary">Verify</button>
+                </form>''')
+
+        form = await request.post()
+        token = request.cookies.get('gh_pending')
+        if token not in self.pending or not self.valid_otp(form.get('app_otp', '')):
+            return html_page('Two-factor authentication', '''
+                <div class="flash-error">Two-factor authentication failed.</div>
+                <form method="post"><input type="text" name="app_otp"><button type="submit">Verify</button></form>''')
+        return self.complete(token)
+
+    @staticmethod
+    def valid_otp(code: str) -> bool:
+        try:
+            import pyotp
+        except ImportError:
+            return len(code) == 6 and code.isdigit()
+        return pyotp.TOTP(MFA_SECRET).verify(code, valid_window=1)
+
+    async def verified_device(self, request):
+        token = request.cookies.get('gh_pending')
+        if request.query.get('confirm') and token in self.pending:
+            return self.complete(token)
+        return html_page('Device verification', f'''
+            <p>Check your email for a verification code.</p>
+            <script>setTimeout(() => location.href = '/sessions/verified-device?confirm=1', {int(self.device_delay * 1000)});</script>''')
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.behavior.middleware])
+        app.router.add_route('*', '/login/oauth/authorize', self.authorize)
+        app.router.add_get('/login', self.login)
+        app.router.add_post('/session', self.session)
+        app.router.add_route('*', '/sessions/two-factor/app', self.two_factor)
+        app.router.add_get('/sessions/verified-device', self.verified_device)
+        return app
+
+
+async def start_app(app: web.Application, hosts: List[str] = (FIXTURE_HOST,)):
+    """在随机空闲端口启动应用（可同时监听多个回环地址），返回 (runner, 端口)"""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, hosts[0], 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    for host in hosts[1:]:
+        await web.TCPSite(runner, host, port).start()
+    return runner, port
+
+
+# ==================== 基准测试 ====================
+def synthetic_accounts(provider: str, count: int, bad_rate: float, mfa_rate: float) -> List[Dict]:
+    """生成合成账号（固定随机种子，结果可复现）"""
+    rng = random.Random(count)
+    accounts = []
+    for i in range(count):
+        password = BAD_PASSWORD if rng.random() < bad_rate else GOOD_PASSWORD
+        if provider == 'serv00':
+            accounts.append({'username': f'user{i}', 'password': password, 'panelnum': str(i % PANEL_COUNT + 1)})
+        else:
+            mfa = rng.random() < mfa_rate
+            account = {'username': f'{"mfa" if mfa else "user"}{i}', 'password': password}
+            if mfa:
+                account['mfasecret'] = MFA_SECRET
+            accounts.append(account)
+    return accounts
+
+
+def current_rss_mb() -> Optional[float]:
+    """本进程当前 RSS（MB），没有 /proc 时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+class RssSampler:
+    """
+    在一轮测试期间定期采样 RSS，分别记录本进程与子进程（浏览器）的峰值
+
+    ru_maxrss 是整个进程生命周期的最高值，多轮测试时后面的规模会沿用前面的峰值，所以改为逐轮采样；
+    没有 /proc 的系统上退回 ru_maxrss
+    """
+
+    def __init__(self, ak, interval: float = 0.2):
+        self.ak = ak
+        self.interval = interval
+        self.peak = {'self': None, 'children': None}
+        self.task = None
+
+    def sample(self):
+        """采样一次"""
+        for key, value in (('self', current_rss_mb()), ('children', self.ak.process_tree_rss_mb())):
+            if value is not None:
+                self.peak[key] = max(self.peak[key] or 0.0, value)
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> Dict[str, float]:
+        """停止采样，返回本轮峰值（MB）"""
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.sample()
+        if self.peak['self'] is None:
+            # 没有 /proc：只能给出进程生命周期内的峰值
+            self.peak['self'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            self.peak['children'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        return {key: round(value or 0.0, 1) for key, value in self.peak.items()}
+
+
+async def run_size(ak, provider: str, accounts: List[Dict]) -> Dict:
+    """跑一轮指定规模的登录，返回统计结果"""
+    telegram = ak.Telegram()
+    metrics = ak.RunMetrics()
+    sessions = ak.SessionCache(enabled=False)
+
+    sampler = RssSampler(ak)
+    sampler.start()
+    start = time.monotonic()
+    if provider == 'serv00':
+        login = ak.Serv00Login(telegram, sessions=sessions, metrics=metrics)
+    else:
+        login = ak.ClawCloudLogin(telegram, sessions=sessions, metrics=metrics)
+    try:
+        await login.run(accounts)
+    finally:
+        elapsed = time.monotonic() - start
+        peak_rss = await sampler.stop()
+    await telegram.close()
+
+    totals = [s for s in metrics.spans if s['step'] == 'total']
+    return {
+        'provider': provider,
+        'accounts': len(accounts),
+        'succeeded': sum(1 for s in totals if s['ok']),
+        'elapsed': round(elapsed, 2),
+        'accounts_per_minute': round(len(accounts) / elapsed * 60, 1) if elapsed else 0,
+        'steps': [row for row in metrics.summary()],
+        'peak_rss_mb': peak_rss,
+    }
+
+
+def print_result(result: Dict):
+    """打印一轮结果"""
+    print('\n' + '=' * 60)
+    print(f"{result['provider']} × {result['accounts']} 个账号: {result['elapsed']} 秒, "
+          f"{result['accounts_per_minute']} 账号/分钟, 成功 {result['succeeded']}")
+    print(f"峰值 RSS: 本进程 {result['peak_rss_mb']['self']} MB, 子进程 {result['peak_rss_mb']['children']} MB")
+    print(f"{'步骤':<22}{'次数':>6}{'失败':>6}{'p50(s)':>10}{'p95(s)':>10}")
+    for row in result['steps']:
+        print(f"{row['step']:<22}{row['count']:>6}{row['failures']:>6}{row['p50']:>10.3f}{row['p95']:>10.3f}")
+    print('=' * 60)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='使用本地模拟服务器对保活脚本做离线基准测试')
+    parser.add_argument('--provider', choices=['serv00', 'clawcloud'], default='serv00')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help='账号规模')
+    parser.add_argument('--latency', type=float, default=0.05, help='模拟服务器每个请求的基础延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.05, help='额外随机延迟上限（秒）')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='请求返回 502 的概率')
+    parser.add_argument('--bad-password-rate', type=float, default=0.05, help='合成账号中密码错误的比例')
+    parser.add_argument('--mfa-rate', type=float, default=0.3, help='ClawCloud 合成账号中需要 TOTP 的比例')
+    parser.add_argument('--concurrency', type=int, help='覆盖提供商的并发数')
+    parser.add_argument('--serv00-mode', choices=['http', 'browser'], default='http', help='Serv00 登录方式')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    if len(args.sizes) > 1:
+        # 每个规模在独立的子进程中运行：Python 不会把释放的内存还给系统，同一进程里后面的规模会沿用前面的内存峰值
+        results = []
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                out = os.path.join(tmp, 'result.json')
+                proc = await asyncio.create_subprocess_exec(
+                    sys.executable, os.path.abspath(__file__), *sys.argv[1:], '--sizes', str(size), '--json', out
+                )
+                if await proc.wait() != 0:
+                    raise SystemExit(f'{size} 个账号的基准测试失败（退出码 {proc.returncode}）')
+                with open(out, 'r', encoding='utf-8') as f:
+                    results += json.load(f)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f'结果已写入 {args.json}')
+        return
+
+    behavior = FixtureBehavior(args.latency, args.jitter, args.failure_rate)
+    panel = Serv00Panel(behavior)
+    claw = ClawCloudSite(behavior)
+    github = GitHubSite(behavior)
+
+    panel_hosts = [f'127.0.0.{n}' for n in range(1, PANEL_COUNT + 1)]
+    panel_runner, panel_port = await start_app(panel.app(), panel_hosts)
+    claw_runner, claw_port = await start_app(claw.app())
+    github_runner, github_port = await start_app(github.app())
+    runners = [panel_runner, claw_runner, github_runner]
+    panel_url = f'http://127.0.0.{{panelnum}}:{panel_port}'
+    claw.base_url = f'http://{FIXTURE_HOST}:{claw_port}'
+    claw.github_url = f'http://{FIXTURE_HOST}:{github_port}'
+
+    # 注入模拟服务器地址后再导入脚本，确保模块级配置读取到这些值
+    os.environ.pop('TELEGRAM_BOT_TOKEN', None)
+    os.environ.update({
+        'SERV00_PANEL_URL': panel_url,
+        'SERV00_HTTP_LOGIN': '1' if args.serv00_mode == 'http' else '0',
+        'CLAW_CLOUD_URL': claw.base_url,
+        'CLAW_CLOUD_DOMAIN': claw.base_url.split('://', 1)[1],
+        'GITHUB_DOMAIN': claw.github_url.split('://', 1)[1],
+        'SESSION_CACHE': '0',
+        'SCREENSHOT_MODE': 'none',
+    })
+    if args.concurrency:
+        os.environ['SERV00_CONCURRENCY'] = os.environ['CLAWCLOUD_CONCURRENCY'] = str(args.concurrency)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import auto_keepalive as ak
+
+    # 基准测试只关心脚本本身的开销，去掉账号之间的礼貌性间隔
+    ak.SERV00_PANEL_DELAY = (0, 0)
+    ak.CLAWCLOUD_DELAY = (0, 0)
+
+    results = []
+    try:
+        for size in args.sizes:
+            accounts = synthetic_accounts(args.provider, size, args.bad_password_rate, args.mfa_rate)
+            result = await run_size(ak, args.provider, accounts)
+            result['fixture'] = {'requests': behavior.requests, 'injected_failures': behavior.failures}
+            print_result(result)
+            results.append(result)
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'结果已写入 {args.json}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
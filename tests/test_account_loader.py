@@ -0,0 +1,73 @@
+"""AccountLoader.parse 测试：任意块边界下解析结果都相同"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auto_keepalive as ak  # noqa: E402
+
+CHUNK_SIZES = (1, 7, 10, 40, 60, 100, 1000, 64 * 1024)
+
+ACCOUNTS = [
+    {'username': 'user1', 'password': 'p1', 'panelnum': '3'},
+    {'username': 'user2', 'password': 'p"2', 'panelnum': '7', 'tags': [{'x': 1}, {'y': [2, 3]}]},
+    {'username': 'user3', 'password': '密码', 'panelnum': '12', 'meta': {'note': '{\n[\n'}},
+]
+
+
+def parse(text: str, chunk_size: int, max_record: int = ak.AccountLoader.max_record):
+    """按固定大小切块后解析，返回解析出的全部值"""
+
+    async def chunks():
+        for i in range(0, len(text), chunk_size):
+            yield text[i:i + chunk_size]
+
+    async def collect():
+        loader = type('Loader', (ak.AccountLoader,), {'max_record': max_record})
+        return [value async for value in loader.parse(chunks())]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_pretty_printed_array(chunk_size):
+    assert parse('\ufeff' + json.dumps(ACCOUNTS, indent=2, ensure_ascii=False), chunk_size) == ACCOUNTS
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_compact_array(chunk_size):
+    assert parse(json.dumps(ACCOUNTS), chunk_size) == ACCOUNTS
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_json_lines(chunk_size):
+    text = '\n'.join(json.dumps(a, ensure_ascii=False) for a in ACCOUNTS) + '\n'
+    assert parse(text, chunk_size) == ACCOUNTS
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_nested_object_on_its_own_line(chunk_size):
+    text = '[\n{\n"username": "u", "password": "p", "panelnum": "1", "tags":\n[\n{ "x": 1 }\n]\n}\n]'
+    assert parse(text, chunk_size) == [{'username': 'u', 'password': 'p', 'panelnum': '1', 'tags': [{'x': 1}]}]
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_malformed_json_line_is_skipped(chunk_size):
+    lines = [json.dumps(ACCOUNTS[0]), '{"username": "broken", "password": }', json.dumps(ACCOUNTS[2])]
+    values = parse('\n'.join(lines), chunk_size)
+    assert len(values) == 3
+    assert values[0] == ACCOUNTS[0]
+    assert isinstance(values[1], ValueError) and '第 2 行' in str(values[1])
+    assert values[2] == ACCOUNTS[2]
+
+
+@pytest.mark.parametrize('chunk_size', (10, 100, 64 * 1024))
+def test_oversized_record_is_bounded(chunk_size):
+    text = '{"username": "' + 'x' * 5000 + '\n' + json.dumps(ACCOUNTS[0])
+    values = parse(text, chunk_size, max_record=1000)
+    assert isinstance(values[0], ValueError)
+    assert values[1:] == [ACCOUNTS[0]]
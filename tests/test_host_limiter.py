@@ -0,0 +1,89 @@
+"""HostLimiter 测试：名额与浏览器上下文预算配合使用时不能互相等待"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auto_keepalive as ak  # noqa: E402
+
+
+class FakeContext:
+    """只实现 BrowserDriver 用到的 on('close') 与 close()"""
+
+    def __init__(self):
+        self.handlers = []
+
+    def on(self, event, handler):
+        if event == 'close':
+            self.handlers.append(handler)
+
+    async def close(self):
+        for handler in self.handlers:
+            handler(self)
+
+
+class FakeBrowser:
+    def is_connected(self):
+        return True
+
+    async def new_context(self, **options):
+        return FakeContext()
+
+
+def test_verification_waits_do_not_deadlock_on_context_budget():
+    """6 个账号同时等待人工验证，上下文预算 4、登录并发 2：全部账号都能完成"""
+
+    async def run():
+        limiter = ak.HostLimiter(2, 2, (0, 0), adaptive=False)
+        driver = ak.BrowserDriver(ak.RunMetrics())
+        driver.browser = FakeBrowser()
+        driver.context_slots = asyncio.Semaphore(4)
+        done = []
+
+        async def login(i):
+            # 与 ClawCloudLogin 相同的顺序：先占登录名额，再打开上下文，验证时归还名额
+            async with limiter.slot(ak.CLAW_CLOUD_DOMAIN) as slot:
+                context = await driver.new_context()
+                try:
+                    trace = ak.AccountTrace(f'user{i}', None)
+                    trace.slot = slot
+                    await trace.slot.give_back()
+                    await asyncio.sleep(0.05)  # 人工验证
+                finally:
+                    await context.close()
+            done.append(i)
+
+        await asyncio.wait_for(asyncio.gather(*(login(i) for i in range(6))), timeout=5)
+        return done, limiter
+
+    done, limiter = asyncio.run(run())
+    assert sorted(done) == list(range(6))
+    assert limiter.hosts[ak.CLAW_CLOUD_DOMAIN].active == 0
+    assert limiter.global_sem._value == 2
+
+
+def test_give_back_is_idempotent_and_frees_slot():
+    async def run():
+        limiter = ak.HostLimiter(1, 1, (0, 0), adaptive=False)
+        order = []
+
+        async def first():
+            async with limiter.slot('h') as slot:
+                await slot.give_back()
+                await slot.give_back()
+                await asyncio.sleep(0.05)
+                order.append('first')
+
+        async def second():
+            await asyncio.sleep(0.01)
+            async with limiter.slot('h'):
+                order.append('second')
+
+        await asyncio.wait_for(asyncio.gather(first(), second()), timeout=5)
+        return order, limiter
+
+    order, limiter = asyncio.run(run())
+    assert order == ['second', 'first']
+    assert limiter.hosts['h'].active == 0
+    assert limiter.global_sem._value == 1
@@ -0,0 +1,45 @@
+"""LoginDetector 固定样本测试：用保存下来的页面验证登录结果判断"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auto_keepalive as ak  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_serv00_failed_login_is_failure():
+    detector = ak.Serv00Login.detector
+    verdict = detector.scan(load_fixture('serv00_login_failed.html'),
+                            'https://panel3.serv00.com/login/?next=/', 'Logowanie :: DevilWEB Panel')
+    ok, _ = detector.judge(verdict)
+    assert ok is False
+    assert verdict['url_match'] is None
+    assert verdict['title_match'] is None
+    assert verdict['error_match']
+
+
+def test_serv00_dashboard_is_success():
+    detector = ak.Serv00Login.detector
+    verdict = detector.scan(load_fixture('serv00_dashboard.html'),
+                            'https://panel3.serv00.com/', 'Strona główna :: DevilWEB Panel')
+    ok, _ = detector.judge(verdict)
+    assert ok is True
+    assert verdict['logout'] is True
+
+
+def test_serv00_panel_host_is_not_a_success_url():
+    assert not ak.Serv00Login.detector.url_ok('https://panel3.serv00.com/login/?next=/')
+
+
+def test_clawcloud_redirect_url():
+    detector = ak.ClawCloudLogin.detector
+    assert detector.url_ok('https://us-west-1.run.claw.cloud/')
+    assert not detector.url_ok('https://us-west-1.run.claw.cloud/signin')
+    assert not detector.url_ok('https://github.com/login/oauth/authorize?redirect_uri=https://run.claw.cloud/callback')
@@ -0,0 +1,51 @@
+"""截图测试：上传文件名与实际图片格式一致"""
+import asyncio
+import builtins
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auto_keepalive as ak  # noqa: E402
+
+
+class FakePage:
+    """按类型返回固定大小的图片字节"""
+
+    def __init__(self, png_bytes: int = 10, jpeg_bytes: int = 10):
+        self.sizes = {'png': png_bytes, 'jpeg': jpeg_bytes}
+
+    async def screenshot(self, type, quality=None):
+        return b'\0' * self.sizes[type]
+
+
+def capture(page):
+    return asyncio.run(ak.capture_screenshot(page))
+
+
+def test_oversized_png_is_uploaded_as_jpeg(monkeypatch):
+    monkeypatch.setattr(ak, 'SCREENSHOT_FORMAT', 'png')
+    monkeypatch.setattr(ak, 'SCREENSHOT_MAX_BYTES', 100)
+    data, fmt = capture(FakePage(png_bytes=1000, jpeg_bytes=50))
+    assert fmt == 'jpeg' and len(data) == 50
+    assert ak.screenshot_filename(fmt) == 'screenshot.jpg'
+
+
+def test_png_within_limit_keeps_png(monkeypatch):
+    monkeypatch.setattr(ak, 'SCREENSHOT_FORMAT', 'png')
+    _, fmt = capture(FakePage())
+    assert ak.screenshot_filename(fmt) == 'screenshot.png'
+
+
+def test_webp_without_pillow_is_uploaded_as_jpeg(monkeypatch):
+    real_import = builtins.__import__
+
+    def no_pillow(name, *args, **kwargs):
+        if name == 'PIL' or name.startswith('PIL.'):
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(ak, 'SCREENSHOT_FORMAT', 'webp')
+    monkeypatch.setattr(builtins, '__import__', no_pillow)
+    _, fmt = capture(FakePage())
+    assert ak.screenshot_filename(fmt) == 'screenshot.jpg'